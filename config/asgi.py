@@ -1,5 +1,8 @@
 """
 ASGI config for repair_cafe project.
+
+Besides the Django application, this serves the live device event stream
+(devices.events) that dashboards subscribe to when LIVE_UPDATES is enabled.
 """
 
 import os
@@ -8,4 +11,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from devices.events import DEVICE_EVENTS_PATH, device_event_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == DEVICE_EVENTS_PATH:
+        await device_event_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
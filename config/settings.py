@@ -36,12 +36,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'devices.metrics.RequestMetricsMiddleware',  # Query count and timings of every request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # Add language support
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'devices.routers.ReplicaRoutingMiddleware',  # Read replica routing (only with DB_REPLICA_NAME)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -50,7 +52,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'devices.metrics.InstrumentedDjangoTemplates',  # DjangoTemplates plus render timing
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,9 +78,84 @@ DATABASES = {
         'PASSWORD': get_env_variable('DB_PASSWORD', ''),
         'HOST': get_env_variable('DB_HOST', ''),
         'PORT': get_env_variable('DB_PORT', ''),
+        # SQLite tests use an in-memory database unless this names a file
+        # (the tests with concurrent threads need one)
+        'TEST': {'NAME': get_env_variable('DB_TEST_NAME')},
     }
 }
 
+# Connections are kept open and reused by the requests of a worker thread for
+# DB_CONN_MAX_AGE seconds ('0': a new connection per request, 'None': no limit),
+# and checked before reuse when DB_CONN_HEALTH_CHECKS is on. Under an ASGI server
+# (ASYNC_VIEWS, LIVE_UPDATES) every request runs in a thread of its own, which would
+# leave its connection open, so the default there is 0 (use the pool below instead).
+DB_CONN_MAX_AGE = get_env_variable(
+    'DB_CONN_MAX_AGE', '0' if 'True' in (get_env_variable('ASYNC_VIEWS'), get_env_variable('LIVE_UPDATES')) else '60',
+)
+DATABASES['default']['CONN_MAX_AGE'] = None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = get_env_variable('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+# PostgreSQL connection pool per worker process (psycopg 3 with psycopg_pool,
+# devices/postgresql_backend) instead of persistent connections. Sizes are per
+# process; idle, lifetime and timeout are in seconds.
+DB_POOL = get_env_variable('DB_POOL', 'False') == 'True'
+DB_POOL_OPTIONS = {
+    'min_size': int(get_env_variable('DB_POOL_MIN_SIZE', '2')),
+    'max_size': int(get_env_variable('DB_POOL_MAX_SIZE', '10')),
+    'max_idle': float(get_env_variable('DB_POOL_MAX_IDLE', '600')),
+    'max_lifetime': float(get_env_variable('DB_POOL_MAX_LIFETIME', '3600')),
+    'timeout': float(get_env_variable('DB_POOL_TIMEOUT', '30')),
+}
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['ENGINE'] = 'devices.postgresql_backend'
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # The pool keeps the connections
+    DATABASES['default']['OPTIONS'] = {'pool': DB_POOL_OPTIONS}
+
+# SQLite production profile, for serving a SQLite database from several worker
+# processes: a WAL journal so reads never block the writer, writers waiting up to
+# SQLITE_BUSY_TIMEOUT ms for each other, and transactions that take the write lock
+# when they begin (devices/sqlite_backend). check_sqlite_contention compares it
+# with the plain backend.
+SQLITE_BUSY_TIMEOUT = int(get_env_variable('SQLITE_BUSY_TIMEOUT', '10000'))
+SQLITE_MMAP_SIZE = int(get_env_variable('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+# Page cache per connection in KiB
+SQLITE_CACHE_SIZE = int(get_env_variable('SQLITE_CACHE_SIZE', '65536'))
+SQLITE_PRODUCTION_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}',
+        # Safe with WAL: a power cut can lose the last commits, never corrupt the database
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+        f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE}',
+        'PRAGMA temp_store=MEMORY',
+    ]),
+}
+SQLITE_PRODUCTION = get_env_variable('SQLITE_PRODUCTION', 'False') == 'True'
+if SQLITE_PRODUCTION and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['ENGINE'] = 'devices.sqlite_backend'
+    DATABASES['default']['OPTIONS'] = SQLITE_PRODUCTION_OPTIONS
+
+# Read replica (devices/routers.py): when DB_REPLICA_NAME is set, the views in
+# DB_REPLICA_VIEWS read from this copy of the database, except in sessions that
+# wrote during the last DB_REPLICA_STICKY_SECONDS. Same engine and credentials as
+# the primary. The alias always exists, so that the tests can route to it (as a
+# mirror of the primary); without DB_REPLICA_NAME nothing is routed there.
+DB_REPLICA_NAME = get_env_variable('DB_REPLICA_NAME', '')
+DB_REPLICA_VIEWS = get_env_variable('DB_REPLICA_VIEWS', 'dashboard,reminders,device_detail').split(',')
+DB_REPLICA_STICKY_SECONDS = int(get_env_variable('DB_REPLICA_STICKY_SECONDS', '10'))
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+    'HOST': get_env_variable('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+    'PORT': get_env_variable('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+    'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+    'TEST': {'MIRROR': 'default'},
+}
+if DB_REPLICA_NAME:
+    DATABASE_ROUTERS = ['devices.routers.ReplicaRouter']
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -136,6 +213,82 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 
+# Caches
+# The default cache is per process; with several workers use a shared backend,
+# e.g. django.core.cache.backends.filebased.FileBasedCache or
+# django.core.cache.backends.redis.RedisCache, so invalidation reaches all of them
+CACHES = {
+    'default': {
+        'BACKEND': get_env_variable('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': get_env_variable('CACHE_LOCATION', ''),
+    },
+}
+
+# Rendered barcodes are cached in memory per process; set BARCODE_CACHE_DIR to
+# also share them between workers through a file-based cache
+BARCODE_CACHE_DIR = get_env_variable('BARCODE_CACHE_DIR', '')
+if BARCODE_CACHE_DIR:
+    CACHES['barcodes'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BARCODE_CACHE_DIR,
+        'TIMEOUT': None,
+    }
+BARCODE_CACHE_ALIAS = get_env_variable('BARCODE_CACHE_ALIAS', 'barcodes' if BARCODE_CACHE_DIR else '')
+
+# Barcode image format for labels: 'png' (Pillow) or 'svg' (vector, no Pillow)
+BARCODE_FORMAT = get_env_variable('BARCODE_FORMAT', 'png')
+
+# Threads used to render barcodes for batch printing
+BARCODE_WORKERS = int(get_env_variable('BARCODE_WORKERS', '4'))
+
+# Maximum number of devices in one batch print document
+BATCH_PRINT_LIMIT = int(get_env_variable('BATCH_PRINT_LIMIT', '500'))
+
+# Browser cache lifetime of barcode images (seconds)
+BARCODE_MAX_AGE = int(get_env_variable('BARCODE_MAX_AGE', '86400'))
+
+# Seconds that dashboard statistics are cached (cleared on every device change)
+DEVICE_STATS_CACHE_TTL = int(get_env_variable('DEVICE_STATS_CACHE_TTL', '10'))
+
+# Dashboard pagination
+DASHBOARD_PAGE_SIZE = int(get_env_variable('DASHBOARD_PAGE_SIZE', '50'))
+DASHBOARD_MAX_PAGE_SIZE = int(get_env_variable('DASHBOARD_MAX_PAGE_SIZE', '500'))
+
+# Seconds a rendered dashboard table is reused; device and user changes clear it sooner
+DASHBOARD_CACHE_TTL = int(get_env_variable('DASHBOARD_CACHE_TTL', '60'))
+
+# Rows fetched per database round trip when streaming exports
+EXPORT_CHUNK_SIZE = int(get_env_variable('EXPORT_CHUNK_SIZE', '2000'))
+
+# Dashboard search: 'auto' picks FTS5 on SQLite and trigram indexes on PostgreSQL,
+# 'basic' forces the plain case-insensitive substring filter
+DEVICE_SEARCH_BACKEND = get_env_variable('DEVICE_SEARCH_BACKEND', 'auto')
+
+# Devices kept in each process's repair station scan lookup cache (devices/lookup.py)
+DEVICE_LOOKUP_CACHE_SIZE = int(get_env_variable('DEVICE_LOOKUP_CACHE_SIZE', '1000'))
+# Seconds a cached lookup is trusted at most, whatever the device table version says
+DEVICE_LOOKUP_CACHE_MAX_AGE = int(get_env_variable('DEVICE_LOOKUP_CACHE_MAX_AGE', '30'))
+
+# Serve the dashboard, device detail, repair station and reminders from async views
+# (devices/async_views.py); only faster under an ASGI server such as uvicorn
+ASYNC_VIEWS = get_env_variable('ASYNC_VIEWS', 'False') == 'True'
+
+# Live dashboard updates over server-sent events; needs an ASGI server (config.asgi)
+LIVE_UPDATES = get_env_variable('LIVE_UPDATES', 'False') == 'True'
+# Event broker class; the default only reaches dashboards connected to the same process
+DEVICE_EVENTS_BACKEND = get_env_variable('DEVICE_EVENTS_BACKEND', 'devices.events.InProcessBroker')
+# Seconds between keepalive comments on idle event streams
+DEVICE_EVENTS_KEEPALIVE = int(get_env_variable('DEVICE_EVENTS_KEEPALIVE', '15'))
+
+# Per-request query counts and timings (Server-Timing header and /metrics)
+REQUEST_METRICS = get_env_variable('REQUEST_METRICS', 'True') == 'True'
+
+# /metrics is served to requests carrying "Authorization: Bearer <METRICS_TOKEN>",
+# or coming from METRICS_ALLOWED_IPS (comma-separated, none by default). Behind a
+# reverse proxy every request comes from the proxy's address, so prefer the token.
+METRICS_TOKEN = get_env_variable('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip for ip in get_env_variable('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
 # Production Security Settings
 if not DEBUG:
     # Only require secure cookies if explicitly set (for HTTPS)
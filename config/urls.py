@@ -4,9 +4,11 @@ URL configuration for repair_cafe project.
 from django.urls import path, include
 from django.conf.urls.i18n import i18n_patterns
 from devices.admin import admin_site
+from devices.views import metrics
 
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')),  # Language switcher
+    path('metrics', metrics, name='metrics'),  # Prometheus scrape target
 ]
 
 urlpatterns += i18n_patterns(
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
-from .models import Device, User
+from .models import ArchivedDevice, Device, DeviceStatusEvent, User
 
 
 class RepairCafeAdminSite(admin.AdminSite):
@@ -20,7 +20,7 @@ admin_site = RepairCafeAdminSite(name='admin')
 
 
 class UserAdmin(BaseUserAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name', 'is_admin', 'is_active')
+    list_display = ('username', 'email', 'first_name', 'last_name', 'is_admin', 'is_active', 'intake_count')
     list_filter = ('is_admin', 'is_active')
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
@@ -47,6 +47,18 @@ class UserAdmin(BaseUserAdmin):
         return readonly_fields
 
 
+class DeviceStatusEventInline(admin.TabularInline):
+    """Read-only status history; events are append-only"""
+    model = DeviceStatusEvent
+    fields = ['timestamp', 'previous_status', 'status', 'synthetic']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class DeviceAdmin(admin.ModelAdmin):
     list_display = [
         'device_id',
@@ -67,7 +79,7 @@ class DeviceAdmin(admin.ModelAdmin):
         'device_type',
         'brand_model',
     ]
-    readonly_fields = ['device_id', 'created_at', 'updated_at']
+    readonly_fields = ['device_id', 'created_at', 'updated_at', 'version']
 
     fieldsets = (
         ('Device Information', {
@@ -83,15 +95,30 @@ class DeviceAdmin(admin.ModelAdmin):
             'fields': ('status', 'repairer_name', 'repair_notes', 'date_finished')
         }),
         ('Metadata', {
-            'fields': ('created_at', 'updated_at'),
+            'fields': ('created_at', 'updated_at', 'version'),
             'classes': ('collapse',)
         }),
     )
+    inlines = [DeviceStatusEventInline]
+
+
+class ArchivedDeviceAdmin(admin.ModelAdmin):
+    """Archived devices can be looked at, not changed (see archive_devices)"""
+    list_display = ['device_id', 'customer_name', 'device_type', 'brand_model', 'status', 'date_finished', 'archived_at']
+    list_filter = ['status', 'device_type']
+    search_fields = DeviceAdmin.search_fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # Register models with custom admin site
 admin_site.register(User, UserAdmin)
 admin_site.register(Device, DeviceAdmin)
+admin_site.register(ArchivedDevice, ArchivedDeviceAdmin)
 
 # Unregister Group model - not needed for this application
 admin.site.unregister(Group)
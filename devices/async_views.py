@@ -0,0 +1,145 @@
+"""
+Async versions of the read-heavy views: dashboard, device detail, repair
+station and reminders.
+
+urls.py uses these instead of their counterparts in views.py when
+ASYNC_VIEWS is True. That only pays off under an ASGI server (uvicorn, see
+DEPLOYMENT_GUIDE.md): there a request waiting for the database no longer
+holds a worker, so barcode scans at the repair station are not queued
+behind a slow dashboard. Under WSGI every async view is run in its own
+event loop, which only adds overhead, so leave ASYNC_VIEWS off there.
+
+Nothing here may touch the database synchronously, including lazily in a
+template: Django raises SynchronousOnlyOperation if it does. Querysets are
+consumed with the async ORM (aget, acount, ``async for``) before rendering,
+and the logged-in user is loaded up front by async_login_required.
+Templates are rendered in worker threads (arender).
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+
+from .caching import adashboard_etag, aget_table_version, areplica_may_lag, dashboard_cache_key
+from .filters import DeviceFilter
+from .forms import DeviceSearchForm
+from .intakers import aintaker_options
+from .models import ArchivedDevice, Device
+from .views import (
+    dashboard_context, dashboard_cursor_params, dashboard_page_params, dashboard_paginator,
+    get_page_size, reminders_context, reminders_paginator, render_device_table, status_events, status_history,
+)
+
+
+def async_login_required(view):
+    """login_required for async views (Django 4.2's decorator only wraps sync views)"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Loads the session and user in a thread; later access is free
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def arender(request, template_name, context):
+    """
+    render() in a worker thread: rendering is CPU-bound, and a large page
+    (e.g. a large dashboard page) would otherwise stall every other request
+    on the event loop. The context must not run queries (nothing lazy).
+    """
+    return await sync_to_async(render, thread_sensitive=False)(request, template_name, context)
+
+
+@async_login_required
+async def dashboard(request):
+    """Main dashboard showing all devices"""
+    etag = await adashboard_etag(request)
+    etag = quote_etag(etag) if etag is not None else None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+
+    device_filter = DeviceFilter.from_query(request.GET)
+    page_size = get_page_size(request)
+    page_params = dashboard_page_params(device_filter, page_size)
+    if device_filter.search:
+        # The first search in a process checks for the SQLite FTS tables with
+        # a query, so build the search querysets once in a thread
+        await sync_to_async(device_filter.querysets)()
+
+    cache_key = dashboard_cache_key(
+        {**page_params, **dashboard_cursor_params(request)},
+        version=await aget_table_version(),
+    )
+    cached = await cache.aget(cache_key)
+
+    if cached is None:
+        page = await dashboard_paginator(device_filter, page_size).apage(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+        cached = {
+            'device_table': await sync_to_async(render_device_table, thread_sensitive=False)(
+                page, device_filter, page_params,
+            ),
+            'reminder_count': await Device.objects.active().needing_reminder().acount(),
+        }
+        if not await areplica_may_lag():
+            await cache.aset(cache_key, cached, settings.DASHBOARD_CACHE_TTL)
+
+    context = dashboard_context(device_filter, cached, await aintaker_options())
+    response = await arender(request, 'devices/dashboard.html', context)
+    patch_cache_control(response, private=True, no_cache=True)
+    if etag is not None:
+        response['ETag'] = etag
+    return response
+
+
+@async_login_required
+async def device_detail(request, device_id):
+    """View device details"""
+    device = await Device.objects.filter(device_id=device_id).afirst()
+    if device is None:
+        device = await ArchivedDevice.objects.filter(device_id=device_id).afirst()
+    if device is None:
+        raise Http404('No Device matches the given query.')
+    context = {
+        'device': device,
+        'status_history': status_history([event async for event in status_events(device)]),
+    }
+    return await arender(request, 'devices/detail.html', context)
+
+
+@async_login_required
+async def repair_station(request):
+    """Repair station interface to search/scan and update devices"""
+    form = DeviceSearchForm()
+    device = None
+
+    if request.GET.get('device_id'):
+        device_id = request.GET.get('device_id')
+        try:
+            device = await Device.objects.aget(device_id=device_id)
+        except Device.DoesNotExist:
+            messages.error(request, f'Device ID "{device_id}" not found.')
+
+    return await arender(request, 'devices/repair_station.html', {'form': form, 'device': device})
+
+
+@async_login_required
+async def reminders(request):
+    """View devices that need reminders, one page at a time"""
+    page_size = get_page_size(request)
+    page = await reminders_paginator(page_size).apage(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    count = await Device.objects.active().needing_reminder().acount()
+    return await arender(request, 'devices/reminders.html', reminders_context(page, page_size, count))
@@ -1,39 +1,214 @@
 """
 Barcode generation utilities for device labels.
+
+Barcodes are rendered either as PNG (through Pillow) or as compact SVG,
+where the Code128 modules are written straight into a single SVG path.
+Rendered barcodes are cached by a content hash of the device ID, format and
+writer options: first in an in-process LRU, then (optionally) in a shared
+Django cache such as the file-based 'barcodes' cache.
 """
 import io
+import json
 import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from xml.sax.saxutils import escape
+
 from barcode import Code128
-from barcode.writer import ImageWriter
+from barcode.writer import ImageWriter, pt2mm
+from django.conf import settings
+from django.core.cache import caches
 
+# Default ImageWriter options for device labels
+BARCODE_OPTIONS = {
+    'module_width': 0.3,  # Width of individual bars
+    'module_height': 10.0,  # Height of bars in mm
+    'quiet_zone': 2.0,  # Margin around barcode
+    'font_size': 10,  # Size of text below barcode
+    'text_distance': 3.0,  # Distance between bars and text
+    'write_text': True,  # Show device ID below barcode
+}
 
-def generate_barcode_base64(device_id: str) -> str:
-    """
-    Generate a Code128 barcode for the given device ID and return as base64 image.
+# Number of rendered barcodes kept in memory per process
+BARCODE_LRU_SIZE = 1024
 
-    Args:
-        device_id: The device ID to encode (e.g., "2025-0042")
+# Supported output formats and their MIME types
+BARCODE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
 
-    Returns:
-        Base64 encoded PNG image string suitable for <img src="data:image/png;base64,...">
+# Blank space above the bars and below the text in SVG output (mm)
+SVG_MARGIN = 1.0
+
+
+def _options_json(options):
+    """Canonical JSON form of the writer options (stable across dict ordering)"""
+    return json.dumps({**BARCODE_OPTIONS, **(options or {})}, sort_keys=True, separators=(',', ':'))
+
+
+def get_barcode_format(barcode_format=None):
+    """Resolve the output format, defaulting to the BARCODE_FORMAT setting"""
+    barcode_format = barcode_format or getattr(settings, 'BARCODE_FORMAT', 'png')
+    if barcode_format not in BARCODE_FORMATS:
+        raise ValueError(f"Unsupported barcode format: {barcode_format!r}")
+    return barcode_format
+
+
+def barcode_cache_key(device_id: str, options: dict = None, barcode_format: str = None) -> str:
     """
+    Content address of a barcode image: the same device ID, format and
+    options always render the same image, so the hash doubles as an ETag.
+    """
+    barcode_format = get_barcode_format(barcode_format)
+    payload = f"code128:{barcode_format}:{device_id}:{_options_json(options)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def render_barcode_png(device_id: str, options: dict = None) -> bytes:
+    """Render a Code128 barcode PNG without any caching"""
     # Create barcode object (Code128 supports alphanumeric characters)
     barcode_class = Code128(device_id, writer=ImageWriter())
 
     # Generate barcode image in memory
     buffer = io.BytesIO()
-    barcode_class.write(buffer, options={
-        'module_width': 0.3,  # Width of individual bars
-        'module_height': 10.0,  # Height of bars in mm
-        'quiet_zone': 2.0,  # Margin around barcode
-        'font_size': 10,  # Size of text below barcode
-        'text_distance': 3.0,  # Distance between bars and text
-        'write_text': True,  # Show device ID below barcode
-    })
-
-    # Get the image data and encode as base64
-    buffer.seek(0)
-    image_data = buffer.getvalue()
+    barcode_class.write(buffer, options={**BARCODE_OPTIONS, **(options or {})})
+    return buffer.getvalue()
+
+
+def _mm(value):
+    """Format a length in mm compactly for SVG attributes"""
+    return f"{value:.3f}".rstrip('0').rstrip('.')
+
+
+def render_barcode_svg(device_id: str, options: dict = None) -> bytes:
+    """
+    Render a Code128 barcode as SVG without Pillow or any caching.
+
+    The bars are encoded by python-barcode and drawn as one path, one
+    rectangle per run of dark modules, using the same dimensions as the
+    PNG writer so labels scan the same.
+    """
+    options = {**BARCODE_OPTIONS, **(options or {})}
+    modules = Code128(device_id).build()[0]
+
+    module_width = options['module_width']
+    module_height = options['module_height']
+    quiet_zone = options['quiet_zone']
+
+    bars = []
+    position = 0
+    for run in modules.replace('0', ' 0 ').split():
+        if run == '0':
+            position += 1
+            continue
+        # Each run is a sequence of consecutive dark modules
+        x = quiet_zone + position * module_width
+        bar_width = _mm(len(run) * module_width)
+        bars.append(f"M{_mm(x)} {_mm(SVG_MARGIN)}h{bar_width}v{_mm(module_height)}h-{bar_width}z")
+        position += len(run)
+
+    width = 2 * quiet_zone + len(modules) * module_width
+    height = SVG_MARGIN + module_height + SVG_MARGIN
+
+    text = ''
+    if options['write_text'] and options['font_size']:
+        baseline = SVG_MARGIN + module_height + options['text_distance']
+        height = baseline + SVG_MARGIN
+        text = (
+            f'<text x="{_mm(width / 2)}" y="{_mm(baseline)}" font-size="{_mm(pt2mm(options["font_size"]))}" '
+            f'font-family="monospace" text-anchor="middle">{escape(device_id)}</text>'
+        )
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_mm(width)}mm" height="{_mm(height)}mm" '
+        f'viewBox="0 0 {_mm(width)} {_mm(height)}">'
+        f'<rect width="100%" height="100%" fill="#fff"/>'
+        f'<path d="{"".join(bars)}"/>{text}</svg>'
+    ).encode('utf-8')
+
+
+RENDERERS = {
+    'png': render_barcode_png,
+    'svg': render_barcode_svg,
+}
+
+
+def get_shared_cache():
+    """The optional cross-process barcode cache, or None if not configured"""
+    alias = getattr(settings, 'BARCODE_CACHE_ALIAS', '')
+    return caches[alias] if alias else None
+
+
+@lru_cache(maxsize=BARCODE_LRU_SIZE)
+def _cached_barcode(key, device_id, barcode_format, options_json):
+    shared_cache = get_shared_cache()
+    cache_key = f"barcode:{key}"
+
+    if shared_cache is not None:
+        image_data = shared_cache.get(cache_key)
+        if image_data is not None:
+            return image_data
+
+    image_data = RENDERERS[barcode_format](device_id, json.loads(options_json))
+
+    if shared_cache is not None:
+        shared_cache.set(cache_key, image_data, timeout=None)
+    return image_data
+
+
+def generate_barcode(device_id: str, barcode_format: str = None, options: dict = None) -> bytes:
+    """
+    Return a Code128 barcode image for a device ID, rendering it only on a cache miss.
+
+    Args:
+        device_id: The device ID to encode (e.g., "2025-0042")
+        barcode_format: 'png' or 'svg'; defaults to the BARCODE_FORMAT setting
+        options: Writer options overriding BARCODE_OPTIONS
+
+    Returns:
+        Image bytes in the requested format
+    """
+    barcode_format = get_barcode_format(barcode_format)
+    key = barcode_cache_key(device_id, options, barcode_format)
+    return _cached_barcode(key, device_id, barcode_format, _options_json(options))
+
+
+def generate_barcode_base64(device_id: str, options: dict = None, barcode_format: str = None) -> str:
+    """
+    Generate a Code128 barcode for the given device ID and return as base64 image.
+
+    Args:
+        device_id: The device ID to encode (e.g., "2025-0042")
+        options: Writer options overriding BARCODE_OPTIONS
+        barcode_format: 'png' or 'svg'; defaults to the BARCODE_FORMAT setting
+
+    Returns:
+        Base64 encoded image string suitable for <img src="data:image/...;base64,...">
+    """
+    barcode_format = get_barcode_format(barcode_format)
+    image_data = generate_barcode(device_id, barcode_format, options)
     base64_image = base64.b64encode(image_data).decode('utf-8')
 
-    return f"data:image/png;base64,{base64_image}"
+    return f"data:{BARCODE_FORMATS[barcode_format]};base64,{base64_image}"
+
+
+def generate_barcodes_base64(device_ids, barcode_format: str = None, max_workers: int = None) -> list:
+    """
+    Render base64 barcodes for many device IDs in parallel, in input order.
+
+    Args:
+        device_ids: The device IDs to encode
+        barcode_format: 'png' or 'svg'; defaults to the BARCODE_FORMAT setting
+        max_workers: Size of the thread pool; defaults to the BARCODE_WORKERS setting
+
+    Returns:
+        A list of data URIs, one per device ID
+    """
+    barcode_format = get_barcode_format(barcode_format)
+    max_workers = max_workers or getattr(settings, 'BARCODE_WORKERS', 4)
+    render = partial(generate_barcode_base64, barcode_format=barcode_format)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(render, device_ids))
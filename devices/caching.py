@@ -0,0 +1,141 @@
+"""
+Caching of the dashboard's device table.
+
+Everything the dashboard shows about devices depends on one "device table
+version" number kept in the default cache. Saving or deleting a device or a
+user bumps it once the change is committed (see signals.py), which makes
+every cached table and every ETag handed out before the change obsolete at
+once, without having to know which filters or pages the change affected.
+
+Entries also expire after DASHBOARD_CACHE_TTL seconds, because the day counts
+and reminder count change with time even when no device does. With several
+worker processes, configure a shared cache (file or Redis) so that a bump in
+one worker reaches the others.
+
+Tables read from a lagging read replica (see routers.py) are cached apart
+from those read from the primary, so a session that just wrote never gets a
+table rendered without its change. The version is bumped on the primary,
+which the replica may not have caught up with yet: for
+DB_REPLICA_STICKY_SECONDS after a bump (the lag the routing allows for),
+tables read from the replica are neither cached nor given an ETag, so an
+outdated table is never kept under the new version.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+from django.utils import translation
+
+from .models import Device
+
+TABLE_VERSION_KEY = 'devices:table_version'
+
+# When the version was last bumped (time.time())
+TABLE_BUMPED_AT_KEY = 'devices:table_bumped_at'
+
+
+def get_table_version():
+    """The current device table version"""
+    version = cache.get(TABLE_VERSION_KEY)
+    if version is None:
+        # Start from the clock, not 0, so a version lost with an evicted or
+        # restarted cache never matches entries cached before
+        cache.add(TABLE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(TABLE_VERSION_KEY)
+    return version
+
+
+async def aget_table_version():
+    """Async version of get_table_version()"""
+    version = await cache.aget(TABLE_VERSION_KEY)
+    if version is None:
+        await cache.aadd(TABLE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(TABLE_VERSION_KEY)
+    return version
+
+
+def bump_table_version():
+    """Invalidate all cached device tables and dashboard ETags"""
+    try:
+        cache.incr(TABLE_VERSION_KEY)
+    except ValueError:
+        cache.set(TABLE_VERSION_KEY, time.time_ns(), timeout=None)
+    cache.set(TABLE_BUMPED_AT_KEY, time.time(), timeout=None)
+
+
+def _bumped_recently(bumped_at):
+    return bumped_at is not None and time.time() - bumped_at < settings.DB_REPLICA_STICKY_SECONDS
+
+
+def replica_may_lag():
+    """
+    Whether this request reads devices from the read replica, and the version
+    was bumped so recently that the replica may not have the change yet
+    """
+    if router.db_for_read(Device) == DEFAULT_DB_ALIAS:
+        return False
+    return _bumped_recently(cache.get(TABLE_BUMPED_AT_KEY))
+
+
+async def areplica_may_lag():
+    """Async version of replica_may_lag()"""
+    if router.db_for_read(Device) == DEFAULT_DB_ALIAS:
+        return False
+    return _bumped_recently(await cache.aget(TABLE_BUMPED_AT_KEY))
+
+
+def _digest(*parts):
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _time_bucket():
+    """Changes every DASHBOARD_CACHE_TTL seconds, so time-dependent values get refreshed"""
+    return int(time.time() // max(settings.DASHBOARD_CACHE_TTL, 1))
+
+
+def dashboard_cache_key(params, version=None):
+    """
+    Cache key of the device table for the given (normalised) query parameters.
+
+    The table does not depend on who looks at it, only on the data (and the
+    database it is read from), the parameters and the language, so it is
+    shared between users.
+    """
+    if version is None:
+        version = get_table_version()
+    return 'devices:dashboard:' + _digest(
+        version, _time_bucket(), translation.get_language(), sorted(params.items()), router.db_for_read(Device),
+    )
+
+
+def _user_etag(request, version):
+    if not request.user.is_authenticated or len(messages.get_messages(request)):
+        return None
+    # The page's forms (the logout button) hold a CSRF token, which changes
+    # with every login, as does the session key
+    return _digest(
+        version, _time_bucket(), translation.get_language(),
+        request.user.pk, request.session.session_key, request.META.get('CSRF_COOKIE'),
+        sorted(request.GET.lists()),
+    )
+
+
+def dashboard_etag(request, *args, **kwargs):
+    """
+    ETag of a user's dashboard page, or None (no conditional response) while
+    flash messages are waiting to be shown on it, or while it is read from a
+    replica that may lag behind the version.
+    """
+    if replica_may_lag():
+        return None
+    return _user_etag(request, get_table_version())
+
+
+async def adashboard_etag(request):
+    """Async version of dashboard_etag(); request.user must already be loaded"""
+    if await areplica_may_lag():
+        return None
+    return _user_etag(request, await aget_table_version())
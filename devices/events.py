@@ -0,0 +1,181 @@
+"""
+Live device-change events for dashboards, as server-sent events (SSE).
+
+Saving or deleting a device publishes a small event (device ID, status,
+repairer) once the transaction commits. Dashboards keep an EventSource
+connection open to DEVICE_EVENTS_PATH and patch the matching table row.
+
+The stream is a plain ASGI application that config/asgi.py routes to
+before Django's request handling. A connection is then one asyncio task
+waiting on a queue, so a single async worker can hold hundreds of idle
+dashboards, and a disconnect is noticed right away. Under WSGI (runserver,
+gunicorn with sync workers) the path does not exist, so LIVE_UPDATES should
+stay off there.
+
+Events are distributed by a broker, DEVICE_EVENTS_BACKEND. The default
+InProcessBroker needs no external service but only reaches dashboards
+connected to the process where the device was saved. To fan out across
+processes, plug in a broker with the same interface: publish(event), safe
+to call from any thread, and subscribe(), returning an object with
+``async get()`` and ``close()``.
+"""
+import asyncio
+import io
+import json
+import threading
+from functools import lru_cache
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+DEVICE_EVENTS_PATH = '/events/devices/'
+
+# Events buffered per connection before the oldest are dropped
+EVENT_QUEUE_SIZE = 100
+
+# Milliseconds browsers wait before reconnecting a dropped stream
+RECONNECT_DELAY = 3000
+
+
+def device_event(device, event_type='saved'):
+    """The event payload for a device change"""
+    return {
+        'type': event_type,
+        'device_id': device.device_id,
+        'status': device.status,
+        'repairer_name': device.repairer_name,
+    }
+
+
+class Subscription:
+    """One connected dashboard: a bounded queue owned by its event loop"""
+
+    def __init__(self, broker, loop):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def deliver(self, event):
+        """Queue an event from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The event loop is gone; so is the connection
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()  # A stalled client loses its oldest events
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Publish/subscribe within this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def subscribe(self):
+        """Subscribe the calling event loop; returns a Subscription"""
+        subscription = Subscription(self, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """The configured event broker (one per process)"""
+    return import_string(settings.DEVICE_EVENTS_BACKEND)()
+
+
+def publish_device_event(event):
+    get_broker().publish(event)
+
+
+def format_event(event):
+    """Encode an event in the text/event-stream format"""
+    return f'event: device\ndata: {json.dumps(event, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+def _authenticated_user(request):
+    """Load the session user like SessionMiddleware + AuthenticationMiddleware would"""
+    try:
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        user = get_user(request)
+        return user if user.is_authenticated else None
+    finally:
+        close_old_connections()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def device_event_stream(scope, receive, send):
+    """ASGI application streaming device events to a logged-in user"""
+    request = ASGIRequest(scope, io.BytesIO())
+    user = await sync_to_async(_authenticated_user)(request)
+    if user is None:
+        await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Forbidden'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),  # Don't let nginx buffer the stream
+        ],
+    })
+
+    subscription = get_broker().subscribe()
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.body', 'body': f'retry: {RECONNECT_DELAY}\n\n'.encode(), 'more_body': True})
+        while True:
+            next_event = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected},
+                timeout=settings.DEVICE_EVENTS_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                next_event.cancel()
+                break
+            if next_event in done:
+                body = format_event(next_event.result())
+            else:
+                # Comment line so proxies and browsers keep an idle stream open
+                next_event.cancel()
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        subscription.close()
+        disconnected.cancel()
@@ -0,0 +1,83 @@
+"""
+Streaming CSV and newline-delimited JSON exports of devices.
+
+Rows are read with values() and iterator(), joined to the intaker's
+username in the same query, and written out one chunk at a time, so memory
+use does not depend on the size of the table.
+"""
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+EXPORT_FIELDS = [
+    'device_id',
+    'intake_datetime',
+    'intaker__username',
+    'customer_name',
+    'phone_number',
+    'email_address',
+    'device_type',
+    'brand_model',
+    'problem_description',
+    'accessories',
+    'work_material_costs',
+    'investigation_cost_paid',
+    'status',
+    'repairer_name',
+    'repair_notes',
+    'date_finished',
+    'created_at',
+    'updated_at',
+]
+
+# Column names in the exported files
+EXPORT_HEADERS = [field.replace('intaker__username', 'intaker') for field in EXPORT_FIELDS]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object that returns what is written, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(querysets, chunk_size=None):
+    """Yield one tuple of EXPORT_FIELDS values per device, one queryset after the other"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    for queryset in querysets:
+        yield from queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def csv_lines(rows):
+    """Yield CSV lines, starting with the header"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ])
+
+
+def ndjson_lines(rows):
+    """Yield one JSON object per line"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_HEADERS, row))) + '\n'
+
+
+def export_lines(querysets, export_format, chunk_size=None):
+    """
+    Yield the lines of an export of the querysets (e.g. devices, then
+    archived devices) in 'csv' or 'ndjson' format
+    """
+    rows = export_rows(querysets, chunk_size)
+    if export_format == 'ndjson':
+        return ndjson_lines(rows)
+    return csv_lines(rows)
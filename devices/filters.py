@@ -0,0 +1,89 @@
+"""
+Filters and sort orders shared by the dashboard, exports and other device listings.
+"""
+from .models import ArchivedDevice, Device
+from .search import RANK_FIELD, search_devices
+
+DASHBOARD_SORTS = [
+    'device_id', '-device_id',
+    'customer_name', '-customer_name',
+    'device_type', '-device_type',
+    'status', '-status',
+    'intake_datetime', '-intake_datetime',
+    'intaker__username', '-intaker__username',
+]
+
+DEFAULT_SORT = '-intake_datetime'
+
+
+class DeviceFilter:
+    """
+    The status/intaker/search filters and sort order of a device listing.
+
+    Searches are sorted by relevance unless another sort is requested.
+    Archived devices are only listed with include_archive.
+    """
+
+    def __init__(self, status='', intaker='', search='', sort=None, include_archive=False):
+        self.status = status or ''
+        self.intaker = str(intaker or '')
+        self.search = (search or '').strip()
+        self.include_archive = bool(include_archive)
+
+        default_sort = f'-{RANK_FIELD}' if self.search else DEFAULT_SORT
+        sort = sort or default_sort
+        if sort not in DASHBOARD_SORTS and not (self.search and sort.lstrip('-') == RANK_FIELD):
+            sort = default_sort
+        self.sort = sort
+
+    @classmethod
+    def from_query(cls, params):
+        """Build a filter from request.GET (or any mapping of query parameters)"""
+        return cls(
+            status=params.get('status', ''),
+            intaker=params.get('intaker', ''),
+            search=params.get('search', ''),
+            sort=params.get('sort'),
+            include_archive=params.get('archive') == '1',
+        )
+
+    def querysets(self):
+        """The filtered devices, followed by the filtered archive if it is included"""
+        querysets = [self.filter(Device.objects.all())]
+        if self.include_archive:
+            querysets.append(self.filter(ArchivedDevice.objects.all()))
+        return querysets
+
+    def filter(self, queryset):
+        """Apply the filters and search (without ordering)"""
+        if self.status:
+            queryset = queryset.filter(status=self.status)
+        if self.intaker:
+            queryset = queryset.filter(intaker_id=self.intaker)
+        if self.search:
+            # Indexed where the database supports it
+            queryset = search_devices(queryset, self.search)
+        return queryset
+
+    def ordering(self):
+        """ORDER BY terms, with device_id as a tie-breaker for a stable order"""
+        if self.sort.lstrip('-') == 'device_id':
+            return [self.sort]
+        return [self.sort, f"{'-' if self.sort.startswith('-') else ''}device_id"]
+
+    def apply(self, queryset):
+        """Apply the filters, search and ordering"""
+        return self.filter(queryset).order_by(*self.ordering())
+
+    def query_params(self):
+        """The active filters and sort as query parameters for links"""
+        params = {'sort': self.sort}
+        if self.status:
+            params['status'] = self.status
+        if self.intaker:
+            params['intaker'] = self.intaker
+        if self.search:
+            params['search'] = self.search
+        if self.include_archive:
+            params['archive'] = '1'
+        return params
@@ -1,3 +1,5 @@
+import re
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import Device, User
@@ -32,8 +34,23 @@ class DeviceIntakeForm(forms.ModelForm):
         }
 
 
+class DeviceImportForm(DeviceIntakeForm):
+    """Intake form rules plus the repair fields, for importing historical records"""
+
+    class Meta(DeviceIntakeForm.Meta):
+        fields = DeviceIntakeForm.Meta.fields + [
+            'intake_datetime',
+            'status',
+            'repairer_name',
+            'repair_notes',
+            'date_finished',
+        ]
+
+
 class DeviceRepairForm(forms.ModelForm):
     """Form for repairers to update device status and add notes"""
+    # Version of the device when the form was loaded, for optimistic locking
+    version = forms.IntegerField(widget=forms.HiddenInput)
 
     class Meta:
         model = Device
@@ -48,6 +65,25 @@ class DeviceRepairForm(forms.ModelForm):
             'repair_notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 5, 'placeholder': 'Repair solution and notes...'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['version'].initial = self.instance.version
+        # Post the values the form was loaded with, so changed_data holds
+        # what this user changed, not what differs from the device by now
+        for name in self._meta.fields:
+            self.fields[name].show_hidden_initial = True
+
+    def save(self, commit=True):
+        """
+        Save only the changed fields, and only if nobody else saved the device
+        since the form was loaded. Raises DeviceConflictError otherwise.
+        """
+        device = super().save(commit=False)
+        device.version = self.cleaned_data['version']
+        if commit:
+            device.save(update_fields=[field for field in self.changed_data if field != 'version'])
+        return device
+
 
 class DeviceSearchForm(forms.Form):
     """Form for searching/scanning devices by ID"""
@@ -61,6 +97,53 @@ class DeviceSearchForm(forms.Form):
     )
 
 
+class BatchPrintForm(forms.Form):
+    """Form for selecting devices to print labels or A4 forms for in one document"""
+    LAYOUT_CHOICES = [
+        ('label', 'Labels'),
+        ('formulier', 'A4 Forms'),
+    ]
+
+    device_ids = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'form-control',
+            'rows': 3,
+            'placeholder': 'Scan or type Device IDs, separated by spaces, commas or new lines',
+        })
+    )
+    intake_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    intake_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    layout = forms.ChoiceField(
+        choices=LAYOUT_CHOICES,
+        initial='label',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def clean_device_ids(self):
+        """Split the scanned IDs into a list, dropping duplicates but keeping order"""
+        device_ids = re.split(r'[\s,;]+', self.cleaned_data['device_ids'])
+        return list(dict.fromkeys(device_id for device_id in device_ids if device_id))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        intake_from = cleaned_data.get('intake_from')
+        intake_to = cleaned_data.get('intake_to')
+
+        if not cleaned_data.get('device_ids') and not (intake_from or intake_to):
+            raise forms.ValidationError('Enter one or more Device IDs or an intake date range.')
+        if intake_from and intake_to and intake_from > intake_to:
+            raise forms.ValidationError('The start date must be before the end date.')
+        return cleaned_data
+
+
 class UserCreateForm(UserCreationForm):
     """Form for creating new users"""
     first_name = forms.CharField(
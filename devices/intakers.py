@@ -0,0 +1,102 @@
+"""
+The intaker filter dropdown on the dashboard.
+
+Each user's number of registered devices is kept in User.intake_count,
+updated incrementally when devices are created, deleted or given another
+intaker (signals.py) and after bulk inserts (import_devices, seed_devices).
+Archiving leaves it alone, so archived devices stay counted. Should the
+counts drift anyway (e.g. after writing devices with raw SQL), the
+recount_intakes command recounts them from the devices.
+
+The dropdown lists the users with intakes, with their counts, from the user
+table alone (no join with the devices). The list is cached until a count or
+a user changes, so it is always read from the primary database, never
+from a read replica that may lag behind.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F
+
+from .models import ArchivedDevice, Device, User
+
+INTAKERS_CACHE_KEY = 'devices:intakers'
+
+OPTION_FIELDS = ['id', 'username', 'first_name', 'last_name', 'intake_count']
+
+
+def intaker_option(row):
+    return {
+        'id': row['id'],
+        'name': ' '.join(filter(None, [row['first_name'], row['last_name']])) or row['username'],
+        'count': row['intake_count'],
+    }
+
+
+def intakers_with_devices():
+    return User.objects.using(DEFAULT_DB_ALIAS).filter(intake_count__gt=0).order_by('username').values(*OPTION_FIELDS)
+
+
+def intaker_options():
+    """Dropdown options ({'id', 'name', 'count'}) of all users with intakes, by username"""
+    options = cache.get(INTAKERS_CACHE_KEY)
+    if options is None:
+        options = [intaker_option(row) for row in intakers_with_devices()]
+        cache.set(INTAKERS_CACHE_KEY, options, None)
+    return options
+
+
+async def aintaker_options():
+    """Async version of intaker_options()"""
+    options = await cache.aget(INTAKERS_CACHE_KEY)
+    if options is None:
+        options = [intaker_option(row) async for row in intakers_with_devices()]
+        await cache.aset(INTAKERS_CACHE_KEY, options, None)
+    return options
+
+
+def forget_intaker_options():
+    cache.delete(INTAKERS_CACHE_KEY)
+
+
+def adjust_intake_counts(deltas, using=None):
+    """
+    Add {user ID: change} to the users' intake counts, in the current
+    transaction. The cached dropdown is dropped once it commits.
+    """
+    changed = False
+    for user_id, delta in deltas.items():
+        if user_id is not None and delta:
+            User.objects.using(using).filter(pk=user_id).update(intake_count=F('intake_count') + delta)
+            changed = True
+    if changed:
+        transaction.on_commit(forget_intaker_options, using=using)
+
+
+def recount_intake_counts(dry_run=False):
+    """
+    Set every user's intake count to the number of devices and archived
+    devices they registered. Returns {user ID: (stored count, actual count)}
+    of the users whose count was wrong.
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        # Lock the users first: intakes committing meanwhile wait, and then
+        # add to the recounted value
+        stored = dict(User.objects.select_for_update().values_list('pk', 'intake_count'))
+        actual = Counter()
+        for model in [Device, ArchivedDevice]:
+            actual.update(dict(
+                model.objects.exclude(intaker=None).values_list('intaker').annotate(count=Count('id')).order_by()
+            ))
+
+        wrong = {
+            user_id: (count, actual[user_id])
+            for user_id, count in stored.items() if count != actual[user_id]
+        }
+        if not dry_run:
+            for user_id, (_, count) in wrong.items():
+                User.objects.filter(pk=user_id).update(intake_count=count)
+            if wrong:
+                transaction.on_commit(forget_intaker_options, using=DEFAULT_DB_ALIAS)
+    return wrong
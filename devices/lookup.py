@@ -0,0 +1,89 @@
+"""
+Barcode-scan lookups for the repair station.
+
+Scanners fire lookups in bursts, often of the same few devices, so the few
+columns the repair station shows are kept in a small in-process LRU keyed
+by device ID. Unknown IDs are cached too, until a device with that ID is
+created.
+
+Saving or deleting a device drops its entry in this process (signals.py).
+Every entry also remembers the device table version it was read at (see
+caching.py), so changes made in other worker processes, and bulk writes
+that send no signals, are noticed as well. As a last resort, entries are
+dropped after DEVICE_LOOKUP_CACHE_MAX_AGE seconds, so a row that was read
+while a change was being committed is not kept for long.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .caching import get_table_version
+from .models import Device
+
+# The columns the repair station shows
+LOOKUP_FIELDS = [
+    'device_id', 'status', 'intake_datetime', 'date_finished',
+    'customer_name', 'phone_number', 'email_address',
+    'device_type', 'brand_model', 'problem_description', 'accessories',
+    'repairer_name', 'repair_notes',
+]
+
+_MISSING = object()
+
+
+class LookupCache:
+    """A thread-safe LRU mapping device IDs to (table version, time cached, row or None)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, device_id, version):
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None or entry[0] != version:
+                return _MISSING
+            if time.monotonic() - entry[1] > settings.DEVICE_LOOKUP_CACHE_MAX_AGE:
+                del self._entries[device_id]
+                return _MISSING
+            self._entries.move_to_end(device_id)
+            return entry[2]
+
+    def set(self, device_id, version, row):
+        with self._lock:
+            self._entries[device_id] = (version, time.monotonic(), row)
+            self._entries.move_to_end(device_id)
+            while len(self._entries) > settings.DEVICE_LOOKUP_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, device_id):
+        with self._lock:
+            self._entries.pop(device_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+lookup_cache = LookupCache()
+
+
+def lookup_device(device_id):
+    """The LOOKUP_FIELDS of a device as a dict, or None if there is no such device"""
+    # Read the version before the row: a change in between makes the entry stale, never wrong
+    version = get_table_version()
+    row = lookup_cache.get(device_id, version)
+    if row is _MISSING:
+        row = Device.objects.filter(device_id=device_id).values(*LOOKUP_FIELDS).first()
+        lookup_cache.set(device_id, version, row)
+    return row
+
+
+def forget_device(device_id):
+    """Drop a device's cached lookup in this process"""
+    lookup_cache.discard(device_id)
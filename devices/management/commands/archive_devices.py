@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.utils import timezone
+from devices.caching import bump_table_version
+from devices.models import ArchivedDevice, Device
+from devices.stats import invalidate_archive_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Move finished devices (repaired, not repaired or free for recycling) that were '
+        'finished more than --older-than days ago from the device table into the archive, '
+        'in batches. Keeps the device table, and with it every dashboard query, bounded by '
+        'the devices still in use. Archived devices keep their status history and can still '
+        'be opened and searched (with "Include archive" on the dashboard).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, help='Days since the device was finished')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Devices moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Count the devices without moving them')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--older-than must not be negative and --batch-size must be at least 1.')
+
+        using = router.db_for_write(Device)
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        finished = Device.objects.using(using).filter(status__in=Device.FINAL_STATUSES, date_finished__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{finished.count()} device(s) finished before {cutoff:%Y-%m-%d %H:%M} would be archived.')
+            return
+
+        started = time.perf_counter()
+        archived = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic(using=using):
+                # Walk the table by primary key; on PostgreSQL the rows stay
+                # locked until they are deleted, so no concurrent edit is lost
+                devices = list(finished.filter(pk__gt=last_pk).order_by('pk').select_for_update()[:options['batch_size']])
+                if not devices:
+                    break
+                last_pk = devices[-1].pk
+
+                ArchivedDevice.objects.using(using).bulk_create([ArchivedDevice.from_device(device) for device in devices])
+                self.delete_devices(using, [device.pk for device in devices])
+            archived += len(devices)
+
+        if archived:
+            # No signals were sent, so clear the caches they would have cleared
+            invalidate_archive_stats()
+            bump_table_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} device(s) finished before {cutoff:%Y-%m-%d %H:%M} in {elapsed:.1f}s; '
+            f'{Device.objects.using(using).count()} device(s) left in the device table.'
+        ))
+
+    def delete_devices(self, using, pks):
+        """
+        Delete the device rows with a plain DELETE. Not QuerySet.delete():
+        that would also delete the status events, and send a signal per device.
+        """
+        connection = connections[using]
+        table = connection.ops.quote_name(Device._meta.db_table)
+        pk_column = connection.ops.quote_name(Device._meta.pk.column)
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE {pk_column} IN ({placeholders})', pks)
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from devices.models import Device, DeviceStatusEvent
+
+
+def synthetic_events(device_pk, status, intake_datetime, date_finished, updated_at):
+    """
+    The most likely status history of a device without one: opened at
+    intake, then moved straight to its current status when it was finished
+    (or, for devices still in progress, when it was last saved).
+    """
+    events = [DeviceStatusEvent(
+        device_id=device_pk, previous_status='', status='open', timestamp=intake_datetime, synthetic=True,
+    )]
+    if status != 'open':
+        changed_at = date_finished if status in Device.FINAL_STATUSES and date_finished else updated_at
+        events.append(DeviceStatusEvent(
+            device_id=device_pk, previous_status='open', status=status,
+            timestamp=max(changed_at, intake_datetime), synthetic=True,
+        ))
+    return events
+
+
+class Command(BaseCommand):
+    help = (
+        'Create synthetic status events for devices that have none, e.g. devices '
+        'from before status history was recorded, or written by import_devices or '
+        'seed_devices. Devices that already have events are left alone, so this '
+        'can safely be run again after an import.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Devices handled per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Count the devices without writing anything')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        without_events = Device.objects.filter(
+            ~Exists(DeviceStatusEvent.objects.filter(device=OuterRef('pk')))
+        ).order_by('pk').values_list('pk', 'status', 'intake_datetime', 'date_finished', 'updated_at')
+
+        started = time.perf_counter()
+        devices = 0
+        events = 0
+        last_pk = 0
+        while True:
+            # Walk the table by primary key, so every batch is one index range
+            with transaction.atomic():
+                batch = list(without_events.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                new_events = [event for row in batch for event in synthetic_events(*row)]
+                if not options['dry_run']:
+                    DeviceStatusEvent.objects.bulk_create(new_events)
+            devices += len(batch)
+            events += len(new_events)
+
+        elapsed = time.perf_counter() - started
+        action = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {events} status event(s) for {devices} device(s) in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,113 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+from devices.models import Device, DeviceIdCounter, DeviceStatusEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Let many repair stations claim open devices at once (Device.objects.claim_next) '
+        'until none are left, then check that every device was claimed exactly once, and '
+        'report claims per second and claim latency. Runs against a freshly created test '
+        'database of the configured engine (SQLite or PostgreSQL), so existing data is '
+        'never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stations', type=int, default=24, help='Concurrent repair stations (threads)')
+        parser.add_argument('--devices', type=int, default=2000, help='Open devices to claim')
+
+    def handle(self, *args, **options):
+        if options['stations'] < 2 or options['devices'] < 2:
+            raise CommandError('--stations and --devices must be at least 2.')
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # The default in-memory test database shares one cache between
+            # threads; a file gives the same locking as a real deployment
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'claims.sqlite3')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.create_devices(options['devices'])
+            self.run_stations(connection.vendor, options['stations'], options['devices'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def create_devices(self, count):
+        now = timezone.now()
+        devices = [
+            Device(
+                intake_datetime=now - timedelta(minutes=count - number),
+                customer_name=f'Claim Test {number}',
+                phone_number='0612345678',
+                device_type='Radio',
+                brand_model='Philips AE5430',
+                problem_description='Gaat niet meer aan.',
+            )
+            for number in range(count)
+        ]
+        DeviceIdCounter.assign_device_ids(devices)
+        Device.objects.bulk_create(devices)
+
+    def run_stations(self, vendor, stations, devices):
+        start_together = threading.Barrier(stations)
+
+        def station(number):
+            claimed = []
+            latencies = []
+            start_together.wait()
+            try:
+                while True:
+                    started = time.perf_counter()
+                    device = Device.objects.claim_next(f'Station {number}')
+                    if device is None:
+                        break
+                    latencies.append(time.perf_counter() - started)
+                    claimed.append(device.pk)
+            finally:
+                connections.close_all()
+            return claimed, latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=stations) as pool:
+            results = list(pool.map(station, range(stations)))
+        elapsed = time.perf_counter() - started
+
+        claimed = [pk for station_claims, _ in results for pk in station_claims]
+        latencies = [latency for _, station_latencies in results for latency in station_latencies]
+        percentiles = statistics.quantiles(latencies, n=100)
+        busiest = max(len(station_claims) for station_claims, _ in results)
+        idlest = min(len(station_claims) for station_claims, _ in results)
+        self.stdout.write(
+            f'{vendor}: {len(claimed)} claims by {stations} stations in {elapsed:.2f}s '
+            f'({len(claimed) / elapsed:.0f}/s), p50 {percentiles[49] * 1000:.1f} ms, '
+            f'p99 {percentiles[98] * 1000:.1f} ms; {idlest}-{busiest} claims per station.'
+        )
+
+        problems = []
+        if len(set(claimed)) != len(claimed):
+            problems.append(f'{len(claimed) - len(set(claimed))} device(s) claimed more than once')
+        if len(claimed) != devices or Device.objects.filter(status='open').exists():
+            problems.append(f'{devices - len(set(claimed))} device(s) left unclaimed')
+        events = DeviceStatusEvent.objects.filter(previous_status='open', status='in_progress').count()
+        if events != len(claimed):
+            problems.append(f'{events} status event(s) for {len(claimed)} claim(s)')
+        repairers = dict(Device.objects.filter(pk__in=claimed).values_list('pk', 'repairer_name'))
+        owners = {pk: f'Station {number}' for number, (station_claims, _) in enumerate(results) for pk in station_claims}
+        if repairers != owners:
+            problems.append('devices assigned to another station than the one that claimed them')
+        if problems:
+            raise CommandError('; '.join(problems) + '.')
+        self.stdout.write(self.style.SUCCESS('Every device was claimed exactly once, oldest first per station.'))
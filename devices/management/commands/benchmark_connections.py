@@ -0,0 +1,120 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from devices.models import Device, User
+
+MODES = ['per_request', 'persistent', 'pool']
+
+PERCENTILES = [50, 95, 99]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the latency of repair station barcode lookups with a new database '
+        'connection per request (CONN_MAX_AGE=0), persistent connections with health '
+        'checks, and a psycopg 3 connection pool (PostgreSQL with DB_POOL=True only). '
+        'Runs against a freshly created test database of the configured engine, so '
+        'existing data is never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Timed requests per mode')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError('--requests must be at least 2.')
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # Connections to the default in-memory test database are never
+            # closed; a file behaves like a real deployment
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'connections.sqlite3')
+
+        settings_dict = connection.settings_dict
+        original = {key: settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        original_options = dict(settings_dict['OPTIONS'])
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            client = self.logged_in_client()
+            self.stdout.write(f"{connection.vendor}: {options['requests']} barcode lookups per mode")
+            baseline = None
+            for mode in options['modes']:
+                if not self.configure(connection, mode):
+                    self.stdout.write(f'{mode:>12}: skipped (needs PostgreSQL with DB_POOL=True)')
+                    continue
+                latencies = self.time_requests(client, options['requests'])
+                median = statistics.median(latencies)
+                baseline = baseline or median
+                percentiles = statistics.quantiles(latencies, n=100)
+                self.stdout.write(
+                    f'{mode:>12}: ' + ', '.join(f'p{p} {percentiles[p - 1] * 1000:.2f} ms' for p in PERCENTILES)
+                    + f' ({median / baseline:.2f}x the first mode)'
+                )
+        finally:
+            connection.close()
+            if hasattr(connection, 'close_pool'):
+                connection.close_pool()
+            settings_dict.update(original)
+            settings_dict['OPTIONS'] = original_options
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def logged_in_client(self):
+        user = User.objects.create_user(username='benchmark', password='benchmark')
+        self.device = Device.objects.create(
+            customer_name='Benchmark',
+            phone_number='0612345678',
+            device_type='Radio',
+            brand_model='Philips AE5430',
+            problem_description='Gaat niet meer aan.',
+            intaker=user,
+        )
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def configure(self, connection, mode):
+        """Set up the connection settings of `mode`; False if it is not available here"""
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+        settings_dict = connection.settings_dict
+        settings_dict['OPTIONS'].pop('pool', None)
+        if mode == 'per_request':
+            settings_dict.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+        elif mode == 'persistent':
+            settings_dict.update(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        elif not hasattr(connection, 'pool'):
+            return False
+        else:
+            settings_dict.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True)
+            settings_dict['OPTIONS']['pool'] = settings.DB_POOL_OPTIONS
+        return True
+
+    def time_requests(self, client, requests):
+        url = reverse('device_lookup') + f'?device_id={self.device.device_id}'
+        latencies = []
+        for number in range(requests + 5):  # The first few warm up caches and the pool
+            started = time.perf_counter()
+            # The test client skips the connection handling a server does at
+            # the start and end of every request
+            close_old_connections()
+            response = client.get(url)
+            close_old_connections()
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}.')
+            if number >= 5:
+                latencies.append(elapsed)
+        return latencies
@@ -0,0 +1,145 @@
+import io
+import json
+import platform
+import statistics
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+from devices.filters import DASHBOARD_SORTS, DeviceFilter
+from devices.models import ArchivedDevice, Device
+from devices.pagination import NULLABLE_SORTS, TIE_BREAKER, KeysetPaginator, MergedKeysetPaginator, encode_cursor
+
+from .benchmark_views import PERCENTILES, nearest_rank
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+
+# Archive the devices finished this many days ago before timing the merged paginator
+ARCHIVE_OLDER_THAN_DAYS = 365
+
+
+class Command(BaseCommand):
+    help = (
+        'Time only the page query of the dashboard paginators (KeysetPaginator on the device '
+        'table, MergedKeysetPaginator on the device table and the archive) for every sort, '
+        'on the first page and on the pages after and before the middle row, at several '
+        'database sizes, and report latency percentiles as JSON. Runs against a freshly '
+        'created test database, so existing data is never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+            help='Numbers of devices to benchmark at (default: 1000 10000 100000 500000)',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed page queries per sort, position and size')
+        parser.add_argument('--page-size', type=int, default=25, help='Rows per page')
+        parser.add_argument('--output', type=str, help='Write the JSON report to this file (default: stdout)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the generated data')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['page_size'] < 1:
+            raise CommandError('--repeat and --page-size must be at least 1.')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            report = self.run_benchmarks(
+                sorted(set(options['sizes'])), options['repeat'], options['page_size'], options['seed'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Wrote benchmark report to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, sizes, repeat, page_size, seed):
+        results = {}
+        for size in sizes:
+            # Start over at every size: archiving empties part of the device table
+            call_command('flush', interactive=False, verbosity=0)
+            call_command('seed_devices', count=size, seed=seed + size, stdout=io.StringIO())
+
+            self.stderr.write(f'Benchmarking {size} devices...')
+            keyset = self.time_sorts(repeat, page_size, include_archive=False)
+            call_command('archive_devices', older_than=ARCHIVE_OLDER_THAN_DAYS, stdout=io.StringIO())
+            merged = self.time_sorts(repeat, page_size, include_archive=True)
+            results[str(size)] = {'keyset': keyset, 'merged': merged}
+
+        return {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'repeat': repeat,
+            'page_size': page_size,
+            'results': results,
+        }
+
+    def time_sorts(self, repeat, page_size, include_archive):
+        """The number of rows paged, and page query latencies per sort and position"""
+        results = {}
+        for sort in DASHBOARD_SORTS:
+            device_filter = DeviceFilter(sort=sort, include_archive=include_archive)
+            querysets = [queryset.select_related('intaker') for queryset in device_filter.querysets()]
+            if include_archive:
+                paginator = MergedKeysetPaginator(querysets, sort, page_size)
+            else:
+                paginator = KeysetPaginator(querysets[0], sort, page_size)
+
+            middle = self.middle_cursor(device_filter)
+            results[sort] = {
+                'first': self.time_pages(paginator, {}, repeat),
+                'after_middle': self.time_pages(paginator, {'after': middle}, repeat),
+                'before_middle': self.time_pages(paginator, {'before': middle}, repeat),
+            }
+        return {
+            'devices': Device.objects.count(),
+            'archived': ArchivedDevice.objects.count() if include_archive else 0,
+            'sorts': results,
+        }
+
+    def middle_cursor(self, device_filter):
+        """Cursor of the middle row of the device table in the filter's order"""
+        field = device_filter.sort.lstrip('-')
+        queryset = device_filter.apply(Device.objects.all())
+        value, tie = queryset.values_list(field, TIE_BREAKER)[queryset.count() // 2]
+        if field == TIE_BREAKER:
+            value = None
+        elif field in NULLABLE_SORTS:
+            value = value or ''
+        return encode_cursor(device_filter.sort, value, tie)
+
+    def time_pages(self, paginator, cursor, repeat):
+        """Latency percentiles (ms) and query count of fetching one page"""
+        durations = []
+        for index in range(repeat + 1):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                page = paginator.page(**cursor)
+                elapsed = time.perf_counter() - start
+            if index == 0:
+                continue  # Warm-up: first connection, query compilation
+            durations.append(elapsed * 1000)
+
+        durations.sort()
+        result = {f'p{percentile}_ms': round(nearest_rank(durations, percentile), 2) for percentile in PERCENTILES}
+        result.update({
+            'mean_ms': round(statistics.fmean(durations), 2),
+            'max_ms': round(durations[-1], 2),
+            'queries': len(queries),
+            'rows': len(page),
+        })
+        return result
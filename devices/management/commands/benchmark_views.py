@@ -0,0 +1,214 @@
+import io
+import json
+import platform
+import statistics
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from devices.models import Device, User
+from devices.urls import urlpatterns
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# URL names that are not benchmarked with a plain GET. Claiming devices
+# changes the data the other URLs are timed against; benchmark_claims times it.
+SKIPPED_URLS = {'logout', 'device_lookup', 'claim_next_device'}
+
+PERCENTILES = [50, 90, 95, 99]
+
+# Devices per batch print request
+BATCH_SIZE = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every device URL with the test client at several database sizes and '
+        'report latency percentiles and query counts as JSON. Runs against a '
+        'freshly created test database, so existing data is never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+            help='Numbers of devices to benchmark at (default: 1000 10000 100000)',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per URL and size')
+        parser.add_argument('--output', type=str, help='Write the JSON report to this file (default: stdout)')
+        parser.add_argument('--baseline', type=str, help='Earlier JSON report to compare median latencies against')
+        parser.add_argument(
+            '--max-regression', type=float,
+            help='Fail if any median latency is more than this fraction slower than the baseline (e.g. 0.2)',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the generated data')
+        parser.add_argument(
+            '--active-share', type=float,
+            help='Fraction of generated devices still in repair (see seed_devices), e.g. 1.0 '
+                 'to time the dashboard and reminders with a large backlog',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        if options['max_regression'] is not None and not options['baseline']:
+            raise CommandError('--max-regression requires --baseline.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            report = self.run_benchmarks(
+                sorted(set(options['sizes'])), options['repeat'], options['seed'], options['active_share'],
+            )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Wrote benchmark report to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.compare(baseline, report, options['max_regression'])
+
+    def run_benchmarks(self, sizes, repeat, seed, active_share=None):
+        admin = User.objects.create_user('benchmark_admin', is_admin=True)
+        client = Client()
+        client.force_login(admin)
+
+        results = {}
+        for size in sizes:
+            # Grow the data set to the next size instead of starting over
+            missing = size - Device.objects.count()
+            if missing > 0:
+                call_command(
+                    'seed_devices', count=missing, seed=seed + size, active_share=active_share, stdout=io.StringIO(),
+                )
+
+            device_ids = list(
+                Device.objects.order_by('?').values_list('device_id', flat=True)[:max(repeat + 1, BATCH_SIZE)]
+            )
+            self.stderr.write(f'Benchmarking {size} devices...')
+            results[str(size)] = {
+                name: self.time_requests(client, requests, repeat)
+                for name, requests in self.get_requests(device_ids, repeat)
+            }
+
+        return {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'repeat': repeat,
+            'active_share': active_share,
+            'results': results,
+        }
+
+    def get_requests(self, device_ids, repeat):
+        """
+        Yield (name, [(method, path, data), ...]) for every URL, one request
+        per repetition plus a warm-up. Device URLs use a different device
+        each time, so per-device caches (e.g. barcodes) start cold.
+        """
+        count = repeat + 1
+        for pattern in urlpatterns:
+            if pattern.name in SKIPPED_URLS:
+                continue
+            if 'device_id' in pattern.pattern.converters:
+                paths = [reverse(pattern.name, args=[device_id]) for device_id in device_ids[:count]]
+            else:
+                paths = [reverse(pattern.name)] * count
+            yield pattern.name, [('get', path, None) for path in paths]
+
+        # Views with a query string or a POST worth timing separately
+        yield 'dashboard_search', [('get', reverse('dashboard'), {'search': 'senseo'})] * count
+        yield 'repair_station_scan', [
+            ('get', reverse('repair_station'), {'device_id': device_id}) for device_id in device_ids[:count]
+        ]
+        yield 'device_lookup_scan', [
+            ('get', reverse('device_lookup'), {'device_id': device_id}) for device_id in device_ids[:count]
+        ]
+        yield f'print_batch_{BATCH_SIZE}', [
+            ('get', reverse('print_batch'), {'device_ids': ' '.join(device_ids[:BATCH_SIZE])})
+        ] * count
+        intake = {
+            'customer_name': 'Benchmark Klant',
+            'phone_number': '0612345678',
+            'device_type': 'Radio',
+            'brand_model': 'Philips AE5430',
+            'problem_description': 'Gaat niet meer aan.',
+        }
+        yield 'device_intake_post', [('post', reverse('device_intake'), intake)] * count
+
+    def time_requests(self, client, requests, repeat):
+        """Latency percentiles (ms) and median query count of a series of requests"""
+        durations = []
+        query_counts = []
+        status_codes = set()
+
+        for index, (method, path, data) in enumerate(requests[:repeat + 1]):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+
+            if index == 0:
+                continue  # Warm-up: imports, template compilation, first connection
+            durations.append(elapsed * 1000)
+            query_counts.append(len(queries))
+            status_codes.add(response.status_code)
+
+        durations.sort()
+        result = {f'p{percentile}_ms': round(nearest_rank(durations, percentile), 2) for percentile in PERCENTILES}
+        result.update({
+            'mean_ms': round(statistics.fmean(durations), 2),
+            'max_ms': round(durations[-1], 2),
+            'queries': int(statistics.median(query_counts)),
+            'status': sorted(status_codes),
+        })
+        return result
+
+    def compare(self, baseline, report, max_regression):
+        """Print median latency changes against a baseline report"""
+        regressions = []
+        self.stderr.write(f'\n{"size":>7}  {"url":<26}{"baseline":>10}{"now":>10}{"change":>9}')
+        for size, urls in report['results'].items():
+            baseline_urls = baseline.get('results', {}).get(size, {})
+            for name, result in urls.items():
+                if name not in baseline_urls:
+                    continue
+                before = baseline_urls[name]['p50_ms']
+                after = result['p50_ms']
+                change = (after - before) / before if before else 0.0
+                line = f'{size:>7}  {name:<26}{before:>8.2f}ms{after:>8.2f}ms{change:>+9.0%}'
+                if max_regression is not None and change > max_regression:
+                    regressions.append(f'{name} at {size} devices')
+                    line = self.style.ERROR(line)
+                self.stderr.write(line)
+
+        if regressions:
+            raise CommandError(f'Slower than baseline by more than {max_regression:.0%}: {", ".join(regressions)}')
+
+
+def nearest_rank(sorted_values, percentile):
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[index]
+
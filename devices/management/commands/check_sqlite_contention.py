@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+# Profiles compared: the environment each worker process is started with
+PROFILES = {
+    'default': {'SQLITE_PRODUCTION': 'False'},
+    'production': {'SQLITE_PRODUCTION': 'True'},
+}
+
+# Share of each kind of write in the workload
+OPERATIONS = {
+    'intake': 0.3,  # Device.objects.create(), as device_intake
+    'update': 0.4,  # Read, then save in a transaction of its own, as device_update
+    'admin_edit': 0.3,  # Read and save in one transaction, as the admin change form
+}
+
+
+def run_worker(until, seed):
+    """Write until the `until` timestamp; returns the worker's counts and latencies"""
+    from devices.models import Device, DeviceConflictError
+
+    statuses = [status for status, _ in Device.STATUS_CHOICES]
+    device_pks = list(Device.objects.values_list('pk', flat=True))
+    connections.close_all()
+    rng = random.Random(seed)
+    operations, weights = zip(*OPERATIONS.items())
+
+    def intake():
+        Device.objects.create(
+            customer_name='Contention Test',
+            phone_number='0612345678',
+            device_type='Radio',
+            brand_model='Philips AE5430',
+            problem_description='Gaat niet meer aan.',
+        )
+
+    def change(device):
+        device.status = rng.choice([status for status in statuses if status != device.status])
+        device.repair_notes = f'Checked by worker {seed}'
+        device.save(update_fields=['status', 'repair_notes'])
+
+    def update():
+        change(Device.objects.get(pk=rng.choice(device_pks)))
+
+    def admin_edit():
+        with transaction.atomic():
+            change(Device.objects.get(pk=rng.choice(device_pks)))
+
+    functions = {'intake': intake, 'update': update, 'admin_edit': admin_edit}
+    result = {'writes': 0, 'locked': 0, 'conflicts': 0, 'latencies': []}
+
+    while time.time() < until:
+        started = time.perf_counter()
+        try:
+            functions[rng.choices(operations, weights)[0]]()
+        except DeviceConflictError:
+            # Optimistic locking caught a concurrent edit: expected, not a lock error
+            result['conflicts'] += 1
+        except OperationalError as error:
+            if 'database is locked' not in str(error):
+                raise
+            result['locked'] += 1
+        else:
+            result['writes'] += 1
+            result['latencies'].append(time.perf_counter() - started)
+    connections.close_all()
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure SQLite write contention: several worker processes register and update '
+        'devices at once for a fixed time, first with the plain SQLite backend and then '
+        'with the production profile (SQLITE_PRODUCTION: WAL journal, busy timeout and '
+        'IMMEDIATE transactions). Reports "database is locked" errors and throughput per '
+        'profile. Runs on copies of a freshly migrated temporary database, so existing '
+        'data is never touched.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Concurrent worker processes')
+        parser.add_argument('--seconds', type=float, default=10, help='Duration of each profile run')
+        parser.add_argument('--devices', type=int, default=1000, help='Devices in the database before the run')
+        parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+        parser.add_argument('--worker-until', type=float, help=argparse.SUPPRESS)
+        parser.add_argument('--worker-seed', type=int, default=0, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker_until'] is not None:
+            self.stdout.write(json.dumps(run_worker(options['worker_until'], options['worker_seed'])))
+            return
+
+        if options['processes'] < 2 or options['seconds'] <= 0:
+            raise CommandError('--processes must be at least 2 and --seconds positive.')
+
+        directory = tempfile.mkdtemp()
+        try:
+            template = os.path.join(directory, 'template.sqlite3')
+            self.manage(template, 'migrate', '--verbosity', '0')
+            self.manage(template, 'seed_devices', '--count', str(options['devices']))
+
+            self.stdout.write(
+                f"{options['processes']} processes writing for {options['seconds']:g}s per profile "
+                f"({', '.join(f'{share:.0%} {name}' for name, share in OPERATIONS.items())})"
+            )
+            for profile in options['profiles']:
+                database = os.path.join(directory, f'{profile}.sqlite3')
+                shutil.copyfile(template, database)
+                results = self.run_profile(database, profile, options['processes'], options['seconds'])
+                self.report(profile, results, options['seconds'])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def worker_environment(self, database, profile):
+        environment = {**os.environ, **PROFILES[profile], 'DB_NAME': database}
+        environment.pop('DB_ENGINE', None)
+        return environment
+
+    def manage(self, database, *arguments):
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), *arguments]
+        subprocess.run(command, env=self.worker_environment(database, 'default'), check=True, capture_output=True)
+
+    def run_profile(self, database, profile, processes, seconds):
+        # Workers start importing Django now and all begin writing at `start`
+        start = time.time() + 3
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'check_sqlite_contention']
+        workers = [
+            subprocess.Popen(
+                [*command, '--worker-until', str(start + seconds), '--worker-seed', str(number)],
+                env=self.worker_environment(database, profile), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+            for number in range(processes)
+        ]
+        results = []
+        for worker in workers:
+            stdout, stderr = worker.communicate()
+            if worker.returncode:
+                raise CommandError(f'Worker failed:\n{stderr.decode()}')
+            results.append(json.loads(stdout))
+        return results
+
+    def report(self, profile, results, seconds):
+        writes = sum(result['writes'] for result in results)
+        locked = sum(result['locked'] for result in results)
+        conflicts = sum(result['conflicts'] for result in results)
+        attempts = writes + locked + conflicts
+        latencies = sorted(latency for result in results for latency in result['latencies'])
+        if len(latencies) >= 2:
+            percentiles = statistics.quantiles(latencies, n=100)
+            timing = f'p50 {percentiles[49] * 1000:.1f} ms, p99 {percentiles[98] * 1000:.1f} ms'
+        else:
+            timing = 'no timings'
+        line = (
+            f'{profile:>10}: {writes / seconds:7.1f} writes/s, {locked} of {attempts} attempts failed '
+            f'with "database is locked" ({locked / max(attempts, 1):.1%}), {conflicts} edit conflict(s); {timing}'
+        )
+        self.stdout.write(self.style.SUCCESS(line) if not locked else self.style.WARNING(line))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from devices.exports import EXPORT_FORMATS, export_lines
+from devices.filters import DASHBOARD_SORTS, DeviceFilter
+from devices.models import Device
+
+
+class Command(BaseCommand):
+    help = 'Export devices as CSV or newline-delimited JSON (streams rows, suitable for cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv', help='Export format')
+        parser.add_argument('--output', type=str, default='-', help='Output file (default: stdout)')
+        parser.add_argument('--status', type=str, default='', help='Only export devices with this status')
+        parser.add_argument('--intaker', type=int, help='Only export devices registered by this user ID')
+        parser.add_argument('--search', type=str, default='', help='Only export devices matching this search')
+        parser.add_argument('--include-archive', action='store_true', help='Also export archived devices (after the others)')
+        parser.add_argument('--sort', type=str, default='device_id', choices=DASHBOARD_SORTS, help='Sort order')
+        parser.add_argument('--chunk-size', type=int, help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        valid_statuses = [value for value, _ in Device.STATUS_CHOICES]
+        if options['status'] and options['status'] not in valid_statuses:
+            raise CommandError(f'Unknown status "{options["status"]}". Choose from: {", ".join(valid_statuses)}')
+
+        device_filter = DeviceFilter(
+            status=options['status'],
+            intaker=options['intaker'],
+            search=options['search'],
+            sort=options['sort'],
+            include_archive=options['include_archive'],
+        )
+        querysets = [queryset.order_by(*device_filter.ordering()) for queryset in device_filter.querysets()]
+        lines = export_lines(querysets, options['format'], options['chunk_size'])
+
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = -1 if options['format'] == 'csv' else 0  # CSV starts with a header line
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} device(s) to {options["output"]}'))
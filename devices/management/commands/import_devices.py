@@ -0,0 +1,165 @@
+import copy
+import csv
+import json
+import sys
+import time
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from devices.caching import bump_table_version
+from devices.intakers import adjust_intake_counts
+from devices.forms import DeviceImportForm
+from devices.models import Device, DeviceIdCounter, User
+from devices.stats import invalidate_device_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Import historical device intake records from CSV or newline-delimited JSON. '
+        'Rows are validated with the intake form rules and written in batches; '
+        'device IDs are always assigned from the intake year.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Input file, or - for stdin')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from file extension)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Devices written per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Validate all rows without writing anything')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or ('ndjson' if options['path'].endswith(('.ndjson', '.jsonl', '.json')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1.')
+
+        # One query for all intakers instead of a lookup per row
+        self.intaker_ids = dict(User.objects.values_list('username', 'id'))
+        self.model_fields = {field.name: field for field in Device._meta.concrete_fields}
+
+        started = time.perf_counter()
+        imported = 0
+        errors = 0
+        batch = []
+
+        input_file = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8-sig')
+        with input_file:
+            for line_number, row in self.read_rows(input_file, input_format):
+                device, row_errors = self.build_device(row)
+                if row_errors:
+                    errors += 1
+                    for error in row_errors:
+                        self.stderr.write(self.style.ERROR(f'Line {line_number}: {error}'))
+                    continue
+
+                batch.append(device)
+                if len(batch) >= batch_size:
+                    imported += self.write_batch(batch, options['dry_run'])
+                    batch = []
+
+            if batch:
+                imported += self.write_batch(batch, options['dry_run'])
+
+        if imported and not options['dry_run']:
+            # bulk_create sends no signals, so clear the caches they would have cleared
+            invalidate_device_stats()
+            bump_table_version()
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed * 60 if elapsed else 0
+        action = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {imported} device(s) in {elapsed:.1f}s ({rate:,.0f} rows/minute); {errors} row(s) with errors.'
+        ))
+
+    def read_rows(self, input_file, input_format):
+        """Yield (line number, row dict) pairs without loading the whole file"""
+        if input_format == 'csv':
+            reader = csv.DictReader(input_file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for line_number, line in enumerate(input_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                row = {'__error__': f'Invalid JSON: {error}'}
+            yield line_number, row
+
+    def build_device(self, row):
+        """Validate a row with the intake form rules; return (device, errors)"""
+        if '__error__' in row:
+            return None, [row['__error__']]
+
+        data = {key: value for key, value in row.items() if key is not None and value is not None}
+        data.setdefault('status', 'open')
+        if data['status'] == '':
+            data['status'] = 'open'
+
+        device, errors = self.clean_row(data)
+        intaker = data.get('intaker', '')
+        if not errors and intaker and intaker not in self.intaker_ids:
+            errors['__all__'] = [f'intaker: Unknown username "{intaker}".']
+        if errors:
+            return None, [
+                f'{field}: {" ".join(messages)}' if field != '__all__' else " ".join(messages)
+                for field, messages in errors.items()
+            ]
+
+        if intaker:
+            device.intaker_id = self.intaker_ids[intaker]
+
+        # Historical records without a finish date are assumed finished on intake
+        if device.status in Device.FINAL_STATUSES and not device.date_finished:
+            device.date_finished = device.intake_datetime
+
+        return device, []
+
+    def clean_row(self, data):
+        """
+        Validate a row like a bound DeviceImportForm would, without building
+        a ModelForm per row: clean a copy of the form's fields, then run the
+        model field validation on the values that passed.
+
+        Returns (unsaved device, {field: [messages]}).
+        """
+        cleaned, errors = {}, {}
+        for name, field in DeviceImportForm.base_fields.items():
+            # A copy per row, like every form instance has. A shallow one:
+            # clean() only reads the widget, validators and error messages,
+            # which a deep copy (for rendering) would duplicate for every row
+            field = copy.copy(field)
+            try:
+                value = field.clean(field.widget.value_from_datadict(data, {}, name))
+            except ValidationError as error:
+                errors[name] = error.messages
+                continue
+            # Like construct_instance(): fields missing from the row keep their model default
+            if self.model_fields[name].has_default() and field.widget.value_omitted_from_data(data, {}, name):
+                continue
+            cleaned[name] = value
+
+        device = Device(**cleaned)
+        try:
+            device.clean_fields(exclude=[name for name in self.model_fields if name not in cleaned])
+        except ValidationError as error:
+            for name, messages in error.message_dict.items():
+                errors.setdefault(name, []).extend(messages)
+        return device, errors
+
+    def write_batch(self, devices, dry_run):
+        """Assign device IDs per intake year in one step each, then bulk insert"""
+        if dry_run:
+            return len(devices)
+
+        with transaction.atomic():
+            DeviceIdCounter.assign_device_ids(devices)
+            Device.objects.bulk_create(devices)
+            adjust_intake_counts(Counter(device.intaker_id for device in devices))
+
+        self.stderr.write(f'... {len(devices)} device(s) written')
+        return len(devices)
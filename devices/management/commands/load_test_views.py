@@ -0,0 +1,181 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from devices.filters import DASHBOARD_SORTS
+from devices.management.commands.benchmark_views import PERCENTILES, nearest_rank
+from devices.models import Device, User
+
+# Devices sampled for scanner lookups and search terms
+SAMPLE_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test a running server (e.g. gunicorn or uvicorn) with concurrent barcode '
+        'scans at the repair station, optionally while other clients load uncached '
+        'dashboard searches and the reminders page. Reports requests/sec and latency '
+        'percentiles per kind of client as JSON. Must use the same database as the server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Base URL of the server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True, help='User the requests are made as')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds to run the test for')
+        parser.add_argument('--scanners', type=int, default=20, help='Concurrent repair station clients')
+        parser.add_argument('--dashboards', type=int, default=4, help='Concurrent dashboard/reminders clients')
+        parser.add_argument('--output', type=str, help='Write the JSON report to this file (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['duration'] <= 0 or options['scanners'] < 1 or options['dashboards'] < 0:
+            raise CommandError('--duration must be positive, --scanners at least 1 and --dashboards not negative.')
+
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only plain http:// server URLs are supported.')
+
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist.')
+        # A real session in the shared database, as if the user had logged in
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+        sample = list(Device.objects.order_by('?').values_list('device_id', 'customer_name')[:SAMPLE_SIZE])
+        if not sample:
+            raise CommandError('There are no devices to look up; run seed_devices first.')
+
+        load_test = LoadTest(url.hostname, url.port or 80, url.netloc, cookie)
+        self.stderr.write(
+            f'Running {options["scanners"]} scanner(s) and {options["dashboards"]} dashboard client(s) '
+            f'against {options["url"]} for {options["duration"]:g}s...'
+        )
+        results = asyncio.run(load_test.run(
+            options['duration'],
+            {
+                'repair_station_scan': (options['scanners'], scan_paths(sample)),
+                'dashboard_reminders': (options['dashboards'], dashboard_paths(sample)),
+            },
+        ))
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'url': options['url'],
+            'duration_s': options['duration'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Wrote load test report to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+
+def scan_paths(sample):
+    """Endless repair station lookups of random devices"""
+    path = reverse('repair_station')
+    while True:
+        device_id, _ = random.choice(sample)
+        yield f'{path}?{urlencode({"device_id": device_id})}'
+
+
+def dashboard_paths(sample):
+    """Reminders pages alternating with dashboard searches that miss the dashboard cache"""
+    dashboard = reverse('dashboard')
+    reminders = reverse('reminders')
+    statuses = [''] + [value for value, _ in Device.STATUS_CHOICES]
+    while True:
+        yield reminders
+        _, customer_name = random.choice(sample)
+        yield f'{dashboard}?' + urlencode({
+            'search': customer_name.split()[-1],
+            'status': random.choice(statuses),
+            'sort': random.choice(DASHBOARD_SORTS),
+        })
+
+
+class LoadTest:
+    """Concurrent HTTP/1.1 GET clients, one request per connection"""
+
+    def __init__(self, host, port, host_header, cookie):
+        self.host = host
+        self.port = port
+        self.host_header = host_header
+        self.cookie = cookie
+
+    async def run(self, duration, clients):
+        """
+        Run every kind of client until `duration` seconds have passed.
+
+        `clients` maps a name to (number of concurrent clients, path iterator).
+        """
+        deadline = time.perf_counter() + duration
+        durations = {name: [] for name in clients}
+        statuses = {name: Counter() for name in clients}
+
+        async def client(name, paths):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await self.get(next(paths))
+                except OSError:
+                    status = None
+                statuses[name][status] += 1
+                if status == 200:
+                    durations[name].append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(
+            client(name, paths) for name, (count, paths) in clients.items() for _ in range(count)
+        ))
+
+        results = {}
+        for name, (count, _) in clients.items():
+            if not count:
+                continue
+            values = sorted(durations[name])
+            result = {
+                'clients': count,
+                'requests': len(values),
+                # Status codes of all responses; "none" counts connections that got none
+                'status': {str(status or 'none'): total for status, total in sorted(statuses[name].items(), key=str)},
+            }
+            if values:
+                result['requests_per_s'] = round(len(values) / duration, 1)
+                result.update({f'p{percentile}_ms': round(nearest_rank(values, percentile), 2) for percentile in PERCENTILES})
+                result['mean_ms'] = round(statistics.fmean(values), 2)
+                result['max_ms'] = round(values[-1], 2)
+            results[name] = result
+        return results
+
+    async def get(self, path):
+        """GET a path and return the response status code"""
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write((
+                f'GET {path} HTTP/1.1\r\n'
+                f'Host: {self.host_header}\r\n'
+                f'Cookie: {self.cookie}\r\n'
+                'Connection: close\r\n\r\n'
+            ).encode('latin-1'))
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()  # The server closes the connection after the body
+        finally:
+            writer.close()
+        try:
+            return int(status_line.split()[1])
+        except (IndexError, ValueError):
+            return None  # Connection closed without a response
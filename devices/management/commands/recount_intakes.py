@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from devices.intakers import recount_intake_counts
+from devices.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount every user's intake count (User.intake_count, shown in the dashboard "
+        'intaker filter) from the devices and archived devices they registered, and '
+        'correct the counts that are wrong. Safe to run while the site is in use.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report wrong counts without correcting them')
+
+    def handle(self, *args, **options):
+        wrong = recount_intake_counts(dry_run=options['dry_run'])
+        usernames = dict(User.objects.filter(pk__in=wrong).values_list('pk', 'username'))
+        for user_id, (stored, actual) in sorted(wrong.items()):
+            self.stdout.write(f'{usernames.get(user_id, user_id)}: {stored} -> {actual}')
+
+        if not wrong:
+            self.stdout.write(self.style.SUCCESS('All intake counts are correct.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(wrong)} user(s) have a wrong intake count.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Corrected the intake count of {len(wrong)} user(s).'))
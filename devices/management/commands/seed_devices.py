@@ -0,0 +1,167 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from devices.caching import bump_table_version
+from devices.intakers import adjust_intake_counts
+from devices.models import Device, DeviceIdCounter, User
+from devices.stats import invalidate_device_stats
+
+FIRST_NAMES = [
+    'Anna', 'Bram', 'Carla', 'Daan', 'Emma', 'Femke', 'Gert', 'Hanna', 'Ivo', 'Joke',
+    'Kees', 'Lotte', 'Mohammed', 'Noor', 'Olga', 'Pieter', 'Quinten', 'Rosa', 'Sanne', 'Tom',
+    'Ursula', 'Vera', 'Willem', 'Yara', 'Zeynep',
+]
+LAST_NAMES = [
+    'de Jong', 'Jansen', 'de Vries', 'van den Berg', 'van Dijk', 'Bakker', 'Janssen', 'Visser',
+    'Smit', 'Meijer', 'de Boer', 'Mulder', 'de Groot', 'Bos', 'Vos', 'Peters', 'Hendriks',
+    'van Leeuwen', 'Dekker', 'Brouwer', 'Yilmaz', 'El Amrani',
+]
+
+# Device type -> typical brands/models
+DEVICES = {
+    'Koffiezetapparaat': ['Philips Senseo HD7865', 'Krups Nespresso XN1001', 'DeLonghi Magnifica', 'Bosch Tassimo'],
+    'Stofzuiger': ['Miele Complete C3', 'Dyson V8', 'Philips PowerPro', 'Vorwerk Kobold VK200'],
+    'Laptop': ['Lenovo ThinkPad T480', 'HP EliteBook 840', 'Dell Latitude 5490', 'Apple MacBook Air 2017'],
+    'Lamp': ['IKEA Ranarp', 'Philips Hue Go', 'Herda bureaulamp', 'Onbekend'],
+    'Radio': ['Philips AE5430', 'Sony ICF-306', 'Tivoli Model One', 'Grundig Music 70'],
+    'Broodrooster': ['Philips HD2581', 'Bourgini Classic', 'Princess 142400', 'Tristar BR-1013'],
+    'Naaimachine': ['Singer Tradition 2282', 'Brother CS10', 'Janome 525S', 'Pfaff Hobby 1142'],
+    'Fiets': ['Gazelle Orange C7', 'Batavus Mambo', 'Sparta Amazone', 'Cortina U4'],
+    'Telefoon': ['Samsung Galaxy S9', 'Apple iPhone 8', 'Motorola Moto G7', 'Fairphone 3'],
+    'Föhn': ['Braun Satin Hair 5', 'Philips DryCare', 'Remington D3010', 'BaByliss 6615E'],
+}
+PROBLEMS = [
+    'Gaat niet meer aan.',
+    'Maakt een raar geluid tijdens gebruik.',
+    'Lekt water aan de onderkant.',
+    'Knop is afgebroken.',
+    'Snoer is beschadigd bij de stekker.',
+    'Wordt erg heet en slaat dan af.',
+    'Scherm blijft zwart.',
+    'Accu laadt niet meer op.',
+    'Werkt af en toe, los contact?',
+]
+ACCESSORIES = ['', '', '', 'Oplader', 'Snoer', 'Afstandsbediening', 'Tas', 'Filter']
+REPAIRERS = ['Henk', 'Marieke', 'Joop', 'Ayla', 'Ruud', 'Sofie']
+REPAIR_NOTES = {
+    'repaired': ['Schakelaar vervangen.', 'Zekering vervangen.', 'Soldeerverbinding hersteld.', 'Schoongemaakt en ontkalkt.'],
+    'not_repaired': ['Onderdeel niet meer leverbaar.', 'Printplaat defect, reparatie te duur.'],
+    'free_for_recycling': ['Klant wil het apparaat niet terug.'],
+}
+
+# Devices older than this are usually finished; newer ones are still in repair
+RECENT_DAYS = 21
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate realistic synthetic devices (and intake users) for development '
+        'and benchmarks. Uses bulk_create, so 100k devices take seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, required=True, help='Number of devices to create')
+        parser.add_argument('--users', type=int, default=5, help='Number of intake users (reused if they exist)')
+        parser.add_argument('--days', type=int, default=730, help='Spread intakes over this many past days')
+        parser.add_argument('--seed', type=int, help='Random seed, for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Devices written per transaction')
+        parser.add_argument(
+            '--active-share', type=float,
+            help='Fraction of devices still in repair (open or in progress), whatever their age, '
+                 'e.g. 1.0 for a large backlog (default: mostly the recent ones)',
+        )
+
+    def handle(self, *args, **options):
+        if options['count'] < 0 or options['users'] < 1 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--count must be positive, and --users, --days and --batch-size at least 1.')
+        if options['active_share'] is not None and not 0 <= options['active_share'] <= 1:
+            raise CommandError('--active-share must be between 0 and 1.')
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        intakers = self.get_intakers(options['users'])
+
+        now = timezone.now()
+        remaining = options['count']
+        while remaining:
+            batch = [
+                self.build_device(rng, intakers, now, options['days'], options['active_share'])
+                for _ in range(min(remaining, options['batch_size']))
+            ]
+            with transaction.atomic():
+                DeviceIdCounter.assign_device_ids(batch)
+                Device.objects.bulk_create(batch)
+                adjust_intake_counts(Counter(device.intaker_id for device in batch))
+            remaining -= len(batch)
+
+        # bulk_create sends no signals, so clear the caches they would have cleared
+        invalidate_device_stats()
+        bump_table_version()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["count"]} device(s) for {len(intakers)} intaker(s) in {elapsed:.1f}s.'
+        ))
+
+    def get_intakers(self, count):
+        """The seed users seed_user_1..N, creating the missing ones"""
+        usernames = [f'seed_user_{number}' for number in range(1, count + 1)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        # Seed users cannot log in; hashing a password per user would dominate small runs
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(
+                username=username,
+                first_name=FIRST_NAMES[index % len(FIRST_NAMES)],
+                last_name='Vrijwilliger',
+                password=password,
+            )
+            for index, username in enumerate(usernames) if username not in existing
+        ])
+        return list(User.objects.filter(username__in=usernames))
+
+    def build_device(self, rng, intakers, now, days, active_share=None):
+        intake_datetime = now - timedelta(seconds=rng.randint(0, days * 86400))
+        age_days = (now - intake_datetime).days
+
+        if active_share is not None:
+            if rng.random() < active_share:
+                status = rng.choices(Device.ACTIVE_STATUSES, [70, 30])[0]
+            else:
+                status = rng.choices(Device.FINAL_STATUSES, [70, 20, 10])[0]
+        elif age_days > RECENT_DAYS:
+            status = rng.choices(['repaired', 'not_repaired', 'free_for_recycling', 'open'], [70, 20, 8, 2])[0]
+        else:
+            status = rng.choices(['open', 'in_progress', 'repaired', 'not_repaired'], [55, 25, 15, 5])[0]
+
+        date_finished = None
+        if status in Device.FINAL_STATUSES:
+            date_finished = min(intake_datetime + timedelta(days=rng.randint(0, 21), hours=rng.randint(0, 8)), now)
+
+        device_type = rng.choice(list(DEVICES))
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        has_email = rng.random() < 0.6
+
+        return Device(
+            intake_datetime=intake_datetime,
+            intaker=rng.choice(intakers),
+            customer_name=f'{first_name} {last_name}',
+            phone_number=f'06{rng.randint(10000000, 99999999)}',
+            email_address=f'{first_name}.{last_name.replace(" ", "")}@example.com'.lower() if has_email else '',
+            device_type=device_type,
+            brand_model=rng.choice(DEVICES[device_type]),
+            problem_description=rng.choice(PROBLEMS),
+            accessories=rng.choice(ACCESSORIES),
+            investigation_cost_paid=rng.random() < 0.8,
+            status=status,
+            repairer_name=rng.choice(REPAIRERS) if status != 'open' else '',
+            repair_notes=rng.choice(REPAIR_NOTES[status]) if status in REPAIR_NOTES else '',
+            date_finished=date_finished,
+        )
@@ -0,0 +1,264 @@
+"""
+Per-request instrumentation: SQL query count, database time, template render
+time and the remaining Python time of every view.
+
+RequestMetricsMiddleware measures each request and reports the numbers in a
+``Server-Timing`` response header (visible in the browser's network tab) and
+in per-view histograms, served in the Prometheus text format by the
+``/metrics`` view. Histograms live in process memory, so every worker process
+reports its own numbers; Prometheus adds them up across scrape targets.
+
+Template time is measured by InstrumentedDjangoTemplates, a drop-in
+replacement for the DjangoTemplates backend. Queries run while a template is
+rendering (lazy querysets) count as database time, not template time.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+METRIC_PREFIX = 'repaircafe'
+
+# Histogram buckets: seconds for durations, plain numbers for query counts
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# (name, help text, buckets) of the per-view histograms
+HISTOGRAMS = [
+    ('request_duration_seconds', 'Time spent handling the request.', DURATION_BUCKETS),
+    ('db_duration_seconds', 'Time spent executing SQL queries.', DURATION_BUCKETS),
+    ('template_duration_seconds', 'Time spent rendering templates, excluding SQL.', DURATION_BUCKETS),
+    ('python_duration_seconds', 'Time spent in Python outside SQL and templates.', DURATION_BUCKETS),
+    ('db_queries', 'Number of SQL queries per request.', QUERY_COUNT_BUCKETS),
+]
+
+_current_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Timings collected while handling one request"""
+    __slots__ = ('queries', 'db', 'template', '_rendering')
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self._rendering = False
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+    def render(self, render, *args):
+        """Call render(*args), adding its duration minus SQL time to the template time"""
+        if self._rendering:
+            # Nested render (e.g. render_to_string in a template tag): already timed
+            return render(*args)
+
+        self._rendering = True
+        db_before = self.db
+        start = time.perf_counter()
+        try:
+            return render(*args)
+        finally:
+            self.template += (time.perf_counter() - start) - (self.db - db_before)
+            self._rendering = False
+
+    def python(self, total):
+        return max(total - self.db - self.template, 0.0)
+
+    def server_timing(self, total):
+        """Value of the Server-Timing header (durations in milliseconds)"""
+        return (
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template * 1000:.2f}, '
+            f'app;dur={self.python(total) * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper installed once on every connection; queries
+    outside an instrumented request pass straight through.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    """connection_created handler (also safe to call for an existing connection)"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    """A cumulative Prometheus histogram"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Non-cumulative per-bucket counts; they are summed up when exported
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+
+class MetricsRegistry:
+    """Per-view histograms and response counters of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._responses = {}
+
+    def observe(self, view, status_code, total, timings):
+        values = (total, timings.db, timings.template, timings.python(total), timings.queries)
+        with self._lock:
+            histograms = self._histograms.get(view)
+            if histograms is None:
+                histograms = self._histograms[view] = [Histogram(buckets) for _, _, buckets in HISTOGRAMS]
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+
+            key = (view, status_code)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._responses.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for index, (name, help_text, _) in enumerate(HISTOGRAMS):
+                metric = f'{METRIC_PREFIX}_{name}'
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for view in sorted(self._histograms):
+                    histogram = self._histograms[view][index]
+                    label = f'view="{escape_label(view)}"'
+                    for bound, count in zip(histogram.buckets, histogram.cumulative_counts()):
+                        lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+                    lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{{label}}} {histogram.sum!r}')
+                    lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+
+            metric = f'{METRIC_PREFIX}_responses_total'
+            lines.append(f'# HELP {metric} Responses by view and HTTP status code.')
+            lines.append(f'# TYPE {metric} counter')
+            for (view, status_code), count in sorted(self._responses.items()):
+                lines.append(f'{metric}{{view="{escape_label(view)}",status="{status_code}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request and record it under the name of the view that
+    handled it. Disabled entirely when REQUEST_METRICS is False.
+
+    Queries are counted by a wrapper that stays installed on each database
+    connection, rather than one pushed onto every connection per request,
+    which keeps the per-request overhead to a few microseconds.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_query_recorder, dispatch_uid='devices.metrics')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Queries run by sync_to_async in a thread see the same context variable
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        return self.record(request, response, timings, time.perf_counter() - start)
+
+    def record(self, request, response, timings, total):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        registry.observe(view, response.status_code, total, timings)
+
+        if 'Server-Timing' not in response:
+            response['Server-Timing'] = timings.server_timing(total)
+        return response
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current_timings.get()
+        if timings is None:
+            return super().render(context, request)
+        return timings.render(super().render, context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The DjangoTemplates backend, with render time added to the request timings"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
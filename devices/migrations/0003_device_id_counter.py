@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:35
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Start each year's counter at the highest device number already used"""
+    Device = apps.get_model('devices', 'Device')
+    DeviceIdCounter = apps.get_model('devices', 'DeviceIdCounter')
+
+    last_numbers = {}
+    for device_id in Device.objects.values_list('device_id', flat=True).iterator():
+        year, _, number = device_id.partition('-')
+        if year.isdigit() and number.isdigit():
+            year, number = int(year), int(number)
+            last_numbers[year] = max(last_numbers.get(year, 0), number)
+
+    DeviceIdCounter.objects.bulk_create([
+        DeviceIdCounter(year=year, last_number=last_number)
+        for year, last_number in last_numbers.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0002_device_investigation_cost_paid_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceIdCounter',
+            fields=[
+                ('year', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+from django.db import OperationalError, migrations, transaction
+
+# The SQL is written out here rather than taken from devices.search, so that
+# later changes to that module do not change what this migration does
+
+SEARCH_FIELDS = ['device_id', 'customer_name', 'phone_number', 'device_type', 'brand_model']
+
+FTS_TABLE = 'devices_device_fts'
+
+COLUMNS = ', '.join(SEARCH_FIELDS)
+NEW_VALUES = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+OLD_VALUES = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+DELETE_OLD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES});"
+INSERT_NEW = f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});"
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{COLUMNS}, content='devices_device', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON devices_device BEGIN {INSERT_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON devices_device BEGIN {DELETE_OLD} END",
+    # Only searchable columns, so status updates do not touch the index
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF {COLUMNS} "
+    f"ON devices_device BEGIN {DELETE_OLD} {INSERT_NEW} END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQLITE_FTS = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRESQL_TRIGRAM_INDEXES = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS devices_device_{field}_trgm '
+    f'ON devices_device USING gin ((UPPER({field}::text)) gin_trgm_ops)'
+    for field in SEARCH_FIELDS
+]
+
+DROP_POSTGRESQL_TRIGRAM_INDEXES = [f'DROP INDEX IF EXISTS devices_device_{field}_trgm' for field in SEARCH_FIELDS]
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for sql in POSTGRESQL_TRIGRAM_INDEXES:
+            schema_editor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                for sql in SQLITE_FTS:
+                    schema_editor.execute(sql)
+        except OperationalError:
+            pass  # This SQLite build lacks FTS5 trigrams; search uses plain filters
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for sql in DROP_POSTGRESQL_TRIGRAM_INDEXES:
+            schema_editor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        for sql in DROP_SQLITE_FTS:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0003_device_id_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0004_device_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['intake_datetime', 'device_id'], name='device_intake_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['status', 'device_id'], name='device_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['status', 'intake_datetime', 'device_id'], name='device_status_intake_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['intaker', 'intake_datetime', 'device_id'], name='device_intaker_intake_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['customer_name', 'device_id'], name='device_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['device_type', 'device_id'], name='device_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(condition=models.Q(('date_finished__isnull', True)), fields=['status', 'intake_datetime'], name='device_unfinished_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0005_device_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented on every save (optimistic locking)'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0006_device_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_status', models.CharField(blank=True, choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('repaired', 'Repaired'), ('not_repaired', 'Not Repaired'), ('free_for_recycling', 'Free for Recycling')], max_length=20)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('repaired', 'Repaired'), ('not_repaired', 'Not Repaired'), ('free_for_recycling', 'Free for Recycling')], max_length=20)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('synthetic', models.BooleanField(default=False, help_text='Reconstructed by backfill_status_events, not recorded when it happened')),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='devices.device')),
+            ],
+            options={
+                'ordering': ['timestamp', 'id'],
+                'indexes': [models.Index(fields=['device', 'timestamp'], name='status_event_device_idx'), models.Index(fields=['status', 'timestamp'], name='status_event_status_idx')],
+            },
+        ),
+    ]
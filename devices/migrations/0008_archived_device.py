@@ -0,0 +1,114 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:37
+
+from django.conf import settings
+from django.db import OperationalError, migrations, models, transaction
+import django.db.models.deletion
+import django.utils.timezone
+
+# The archive gets the same search indexes as the device table (migration
+# 0004). The SQL is written out here rather than taken from devices.search,
+# so that later changes to that module do not change what this migration does.
+
+SEARCH_FIELDS = ['device_id', 'customer_name', 'phone_number', 'device_type', 'brand_model']
+
+ARCHIVE_TABLE = 'devices_archiveddevice'
+FTS_TABLE = 'devices_archiveddevice_fts'
+
+COLUMNS = ', '.join(SEARCH_FIELDS)
+NEW_VALUES = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+OLD_VALUES = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+DELETE_OLD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES});"
+INSERT_NEW = f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});"
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{COLUMNS}, content='{ARCHIVE_TABLE}', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {ARCHIVE_TABLE} BEGIN {INSERT_NEW} END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {ARCHIVE_TABLE} BEGIN {DELETE_OLD} END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF {COLUMNS} "
+    f"ON {ARCHIVE_TABLE} BEGIN {DELETE_OLD} {INSERT_NEW} END",
+]
+
+DROP_SQLITE_FTS = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRESQL_TRIGRAM_INDEXES = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_TABLE}_{field}_trgm '
+    f'ON {ARCHIVE_TABLE} USING gin ((UPPER({field}::text)) gin_trgm_ops)'
+    for field in SEARCH_FIELDS
+]
+
+DROP_POSTGRESQL_TRIGRAM_INDEXES = [f'DROP INDEX IF EXISTS {ARCHIVE_TABLE}_{field}_trgm' for field in SEARCH_FIELDS]
+
+
+def create_archive_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for sql in POSTGRESQL_TRIGRAM_INDEXES:
+            schema_editor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                for sql in SQLITE_FTS:
+                    schema_editor.execute(sql)
+        except OperationalError:
+            pass  # This SQLite build lacks FTS5 trigrams; search uses plain filters
+
+
+def drop_archive_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for sql in DROP_POSTGRESQL_TRIGRAM_INDEXES:
+            schema_editor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        for sql in DROP_SQLITE_FTS:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0007_device_status_event'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='devicestatusevent',
+            name='device',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='devices.device'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedDevice',
+            fields=[
+                ('device_id', models.CharField(editable=False, max_length=20, unique=True)),
+                ('intake_datetime', models.DateTimeField(default=django.utils.timezone.now)),
+                ('customer_name', models.CharField(max_length=200)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('email_address', models.EmailField(blank=True, max_length=254)),
+                ('device_type', models.CharField(max_length=100)),
+                ('brand_model', models.CharField(max_length=200)),
+                ('problem_description', models.TextField()),
+                ('accessories', models.TextField(blank=True, help_text='List of accessories brought with the device')),
+                ('work_material_costs', models.TextField(blank=True, help_text='Work and material costs')),
+                ('investigation_cost_paid', models.BooleanField(default=False, help_text='Investigation cost paid')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('repaired', 'Repaired'), ('not_repaired', 'Not Repaired'), ('free_for_recycling', 'Free for Recycling')], default='open', max_length=20)),
+                ('repairer_name', models.CharField(blank=True, max_length=200)),
+                ('repair_notes', models.TextField(blank=True, help_text='Repair solution and notes')),
+                ('date_finished', models.DateTimeField(blank=True, null=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('intaker', models.ForeignKey(help_text='User who registered this device', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_devices', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-intake_datetime'],
+                'indexes': [models.Index(fields=['intake_datetime', 'device_id'], name='archived_intake_idx'), models.Index(fields=['status', 'device_id'], name='archived_status_idx'), models.Index(fields=['status', 'intake_datetime', 'device_id'], name='archived_status_intake_idx'), models.Index(fields=['intaker', 'intake_datetime', 'device_id'], name='archived_intaker_intake_idx'), models.Index(fields=['customer_name', 'device_id'], name='archived_customer_idx'), models.Index(fields=['device_type', 'device_id'], name='archived_type_idx')],
+            },
+        ),
+        migrations.RunPython(create_archive_search_indexes, drop_archive_search_indexes),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:44
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_intakes(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    counts = Counter()
+    for model_name in ['Device', 'ArchivedDevice']:
+        model = apps.get_model('devices', model_name)
+        rows = (
+            model.objects.using(db_alias).exclude(intaker=None)
+            .values_list('intaker').annotate(count=Count('id')).order_by()
+        )
+        counts.update(dict(rows))
+
+    User = apps.get_model('devices', 'User')
+    for user_id, count in counts.items():
+        User.objects.using(db_alias).filter(pk=user_id).update(intake_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0008_archived_device'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='intake_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Devices this user registered, archived ones included (maintained by devices.intakers).'),
+        ),
+        migrations.RunPython(count_intakes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Dashboard listings that include the archive order text by code point
+# (devices.pagination.CodePointOrder), which is the "C" collation on
+# PostgreSQL. These match the archive's sort indexes in that order. SQLite
+# already orders text by code point, so its existing indexes are used.
+CODE_POINT_INDEXES = {
+    'archived_intake_c_idx': 'intake_datetime, device_id COLLATE "C"',
+    'archived_status_c_idx': 'status COLLATE "C", device_id COLLATE "C"',
+    'archived_status_intake_c_idx': 'status, intake_datetime, device_id COLLATE "C"',
+    'archived_intaker_intake_c_idx': 'intaker_id, intake_datetime, device_id COLLATE "C"',
+    'archived_customer_c_idx': 'customer_name COLLATE "C", device_id COLLATE "C"',
+    'archived_type_c_idx': 'device_type COLLATE "C", device_id COLLATE "C"',
+    'archived_device_id_c_idx': 'device_id COLLATE "C"',
+}
+
+
+def create_code_point_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, columns in CODE_POINT_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON devices_archiveddevice ({columns})')
+
+
+def drop_code_point_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in CODE_POINT_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('devices', '0009_user_intake_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_code_point_indexes, drop_code_point_indexes),
+    ]
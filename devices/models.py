@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import F, Q, Subquery
+from django.db.models.functions import Length
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 
@@ -11,6 +14,11 @@ class User(AbstractUser):
         default=False,
         help_text="Designates whether the user has admin privileges (can manage users)."
     )
+    intake_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Devices this user registered, archived ones included (maintained by devices.intakers)."
+    )
 
     class Meta:
         db_table = 'auth_user'
@@ -20,7 +28,7 @@ class User(AbstractUser):
     def __str__(self):
         return self.get_full_name() or self.username
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, update_fields=None, **kwargs):
         """Automatically set is_staff based on is_admin status"""
         # Don't override is_staff for superusers (they always need admin access)
         if not self.is_superuser:
@@ -29,7 +37,15 @@ class User(AbstractUser):
             # Superusers should always have both is_staff and is_admin
             self.is_staff = True
             self.is_admin = True
-        super().save(*args, **kwargs)
+        if update_fields is None and not self._state.adding:
+            # intake_count only changes through F() updates (devices.intakers);
+            # writing back the value loaded with this instance could undo one
+            # made in the meantime
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'intake_count'
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
 
     @property
     def is_operator(self):
@@ -37,7 +53,140 @@ class User(AbstractUser):
         return not self.is_admin
 
 
-class Device(models.Model):
+def format_device_id(year, number):
+    """Format a device ID as YYYY-NNNN (more digits once a year passes 9999)"""
+    return f"{year}-{number:04d}"
+
+
+class DeviceIdCounter(models.Model):
+    """Last device number handed out per year, used to allocate device IDs"""
+    year = models.PositiveIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
+
+    @classmethod
+    def allocate(cls, year, count=1):
+        """
+        Reserve `count` consecutive device numbers for `year`.
+
+        The counter row is bumped with a single UPDATE before it is read, so
+        the row (or, on SQLite, the database) is write-locked for the rest of
+        the transaction and concurrent callers are serialised.
+
+        Returns:
+            The first reserved number.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(year=year).update(last_number=F('last_number') + count):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(year=year, last_number=cls.highest_existing_number(year) + count)
+                except IntegrityError:
+                    # Another transaction created the counter first
+                    cls.objects.filter(year=year).update(last_number=F('last_number') + count)
+
+            last_number = cls.objects.filter(year=year).values_list('last_number', flat=True).get()
+
+        return last_number - count + 1
+
+    @classmethod
+    def assign_device_ids(cls, devices):
+        """
+        Give unsaved devices consecutive IDs from the year of their intake, in
+        intake order, reserving one block of numbers per year (for bulk_create).
+        """
+        devices_by_year = defaultdict(list)
+        for device in devices:
+            devices_by_year[timezone.localtime(device.intake_datetime).year].append(device)
+
+        with transaction.atomic():
+            for year, year_devices in devices_by_year.items():
+                first_number = cls.allocate(year, len(year_devices))
+                year_devices.sort(key=lambda device: device.intake_datetime)
+                for offset, device in enumerate(year_devices):
+                    device.device_id = format_device_id(year, first_number + offset)
+
+    @staticmethod
+    def highest_existing_number(year):
+        """Highest device number already used in `year`, or 0 (archived devices included)"""
+        numbers = [0]
+        for model in (Device, ArchivedDevice):
+            # Longer IDs are higher numbers; within a length, text order is numeric order
+            last_device_id = model.objects.filter(
+                device_id__startswith=f"{year}-"
+            ).order_by(
+                Length('device_id').desc(), '-device_id'
+            ).values_list('device_id', flat=True).first()
+            if last_device_id:
+                numbers.append(int(last_device_id.split('-')[1]))
+        return max(numbers)
+
+
+class DeviceConflictError(Exception):
+    """A device was saved by someone else since this copy of it was read"""
+
+
+class DeviceQuerySet(models.QuerySet):
+    """Queryset with database-side equivalents of the Device helper methods"""
+
+    def active(self):
+        """Devices that are still being worked on and have no finish date"""
+        return self.filter(status__in=Device.ACTIVE_STATUSES, date_finished__isnull=True)
+
+    def needing_reminder(self, days_threshold=None):
+        """
+        Devices for which Device.needs_reminder() is True, evaluated in SQL.
+
+        Mirrors days_in_repair(): unfinished devices are compared against the
+        current time, devices with a finish date against that date.
+        """
+        if days_threshold is None:
+            days_threshold = Device.REMINDER_THRESHOLD_DAYS
+        threshold = timedelta(days=days_threshold)
+        cutoff = timezone.now() - threshold
+
+        return self.exclude(status__in=Device.FINAL_STATUSES).filter(
+            Q(date_finished__isnull=True, intake_datetime__lte=cutoff) |
+            Q(date_finished__isnull=False, date_finished__gte=F('intake_datetime') + threshold)
+        )
+
+    def claim_next(self, repairer_name):
+        """
+        Move the oldest open device to in progress for `repairer_name`, in
+        one atomic step, so that two repair stations never get the same
+        device. Returns the device, or None when no open device is left.
+
+        Where the database supports SELECT ... FOR UPDATE SKIP LOCKED
+        (PostgreSQL), each claim locks its device and concurrent claims skip
+        it, so stations never wait for each other. Elsewhere (SQLite) the
+        oldest open device is touched with a conditional UPDATE before it is
+        read, which write-locks the database for the rest of the transaction
+        (as in DeviceIdCounter.allocate): claims are serialised, and none has
+        to be retried because another station took the same device.
+        """
+        using = router.db_for_write(self.model)
+        open_devices = self.using(using).filter(status='open').order_by('intake_datetime', 'device_id')
+
+        def claim(device):
+            device.status = 'in_progress'
+            device.repairer_name = repairer_name
+            device.save(using=using, update_fields=['status', 'repairer_name'])
+            return device
+
+        with transaction.atomic(using=using):
+            if connections[using].features.has_select_for_update_skip_locked:
+                device = open_devices.select_for_update(skip_locked=True).first()
+                return claim(device) if device is not None else None
+
+            if not open_devices.filter(pk=Subquery(open_devices.values('pk')[:1])).update(version=F('version')):
+                return None
+            return claim(open_devices.first())
+
+
+class AbstractDevice(models.Model):
+    """Fields and helpers shared by devices in the device table and the archive"""
     STATUS_CHOICES = [
         ('open', _('Open')),
         ('in_progress', _('In Progress')),
@@ -45,6 +194,11 @@ class Device(models.Model):
         ('not_repaired', _('Not Repaired')),
         ('free_for_recycling', _('Free for Recycling')),
     ]
+    ACTIVE_STATUSES = ['open', 'in_progress']
+    FINAL_STATUSES = ['repaired', 'not_repaired', 'free_for_recycling']
+
+    # Days after intake before an unfinished device needs a reminder
+    REMINDER_THRESHOLD_DAYS = 7
 
     # Auto-generated Device ID (e.g., 2025-0042)
     device_id = models.CharField(max_length=20, unique=True, editable=False)
@@ -82,54 +236,255 @@ class Device(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    is_archived = False
+
     class Meta:
-        ordering = ['-intake_datetime']
+        abstract = True
 
     def __str__(self):
         return f"{self.device_id} - {self.customer_name} - {self.device_type}"
 
+    def days_in_repair(self):
+        """Calculate how many days the device has been in the system"""
+        if self.date_finished:
+            end_date = self.date_finished
+        else:
+            end_date = timezone.now()
+
+        delta = end_date - self.intake_datetime
+        return delta.days
+
+    def needs_reminder(self, days_threshold=REMINDER_THRESHOLD_DAYS):
+        """Check if device needs a reminder (been in system too long)"""
+        if self.status in self.FINAL_STATUSES:
+            return False
+
+        return self.days_in_repair() >= days_threshold
+
+
+class Device(AbstractDevice):
+    version = models.PositiveIntegerField(
+        default=1, editable=False, help_text="Incremented on every save (optimistic locking)"
+    )
+
+    objects = DeviceQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-intake_datetime']
+        # Match the dashboard filters and sort orders; device_id is the
+        # keyset pagination tie-breaker, so it ends every sort index
+        indexes = [
+            models.Index(fields=['intake_datetime', 'device_id'], name='device_intake_idx'),
+            models.Index(fields=['status', 'device_id'], name='device_status_idx'),
+            models.Index(fields=['status', 'intake_datetime', 'device_id'], name='device_status_intake_idx'),
+            models.Index(fields=['intaker', 'intake_datetime', 'device_id'], name='device_intaker_intake_idx'),
+            models.Index(fields=['customer_name', 'device_id'], name='device_customer_idx'),
+            models.Index(fields=['device_type', 'device_id'], name='device_type_idx'),
+            # Reminders only look at unfinished devices, usually a small part
+            # of the table. The condition has no parameters so that SQLite can
+            # match it against queries with bound parameters.
+            models.Index(
+                fields=['status', 'intake_datetime'],
+                condition=Q(date_finished__isnull=True),
+                name='device_unfinished_idx',
+            ),
+        ]
+
+    # Fields whose values in the database are remembered, so that saving can
+    # tell what it changes without a query (see stored_value())
+    TRACKED_FIELDS = ['status', 'intaker']
+    _stored_values = {}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_stored_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        self._remember_stored_values(fields)
+
+    def stored_value(self, field_name):
+        """A TRACKED_FIELDS value as last read from or written to the database (None if unknown)"""
+        return self._stored_values.get(field_name)
+
+    def _remember_stored_values(self, fields=None):
+        """Remember the tracked values of `fields` (default: all loaded fields)"""
+        stored_values = dict(self._stored_values)
+        for name in self.TRACKED_FIELDS:
+            attname = self._meta.get_field(name).attname
+            if (fields is None or name in fields or attname in fields) and attname in self.__dict__:
+                stored_values[name] = self.__dict__[attname]
+        self._stored_values = stored_values
+
     def save(self, *args, **kwargs):
-        if not self.device_id:
-            self.device_id = self.generate_device_id()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not update_fields:
+            return  # Nothing to write, as in Model.save()
 
         # Set date_finished when status changes to a final state
-        if self.status in ['repaired', 'not_repaired', 'free_for_recycling'] and not self.date_finished:
+        if self.status in self.FINAL_STATUSES and not self.date_finished:
             self.date_finished = timezone.now()
+            if update_fields:
+                update_fields = kwargs['update_fields'] = {*update_fields, 'date_finished'}
 
-        super().save(*args, **kwargs)
+        writes_status = 'status' in update_fields if update_fields else 'status' not in self.get_deferred_fields()
+        if not writes_status or not (self._state.adding or self.status != self.stored_value('status')):
+            self._save_row(*args, **kwargs)
+            self._remember_stored_values(update_fields)
+            return
+
+        # A new status is recorded in the same transaction. The previous
+        # status needs no query: with optimistic locking the update only
+        # succeeds if the row still holds the status this instance read.
+        adding = self._state.adding
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            self._save_row(*args, **kwargs)
+            DeviceStatusEvent.objects.using(using).create(
+                device=self,
+                previous_status='' if adding else (self.stored_value('status') or ''),
+                status=self.status,
+                timestamp=self.intake_datetime if adding else self.updated_at,
+            )
+        self._remember_stored_values(update_fields)
+
+    def _save_row(self, *args, **kwargs):
+        """Insert or update the device row itself"""
+        if not self._state.adding:
+            # Optimistic locking: the UPDATE only matches the row if it still
+            # has the version this instance was read with (see _do_update)
+            if kwargs.get('update_fields'):
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+            self._expected_version = self.version
+            self.version += 1
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version -= 1
+                raise
+            finally:
+                del self._expected_version
+            return
+
+        if self.device_id:
+            super().save(*args, **kwargs)
+            return
+
+        # Allocate the ID in the same transaction as the insert so a failed
+        # save does not leave a gap in the year's numbering (save() usually
+        # opened that transaction already, so no savepoint is needed)
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            self.device_id = self.generate_device_id()
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.device_id = ''
+                raise
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        UPDATE ... WHERE version = <the version read>. Raises
+        DeviceConflictError if the row exists but was saved in the meantime.
+        """
+        expected_version = getattr(self, '_expected_version', None)
+        if expected_version is None:
+            # Not called from save() (e.g. loaddata): a plain update
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+        updated = super()._do_update(
+            base_qs.filter(version=expected_version), using, pk_val, values, update_fields, forced_update,
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise DeviceConflictError(f'Device {self.device_id} was changed by someone else.')
+        return updated
 
     def generate_device_id(self):
         """Generate a unique device ID in format YYYY-NNNN"""
         year = datetime.now().year
+        new_number = DeviceIdCounter.allocate(year)
+        return format_device_id(year, new_number)
 
-        # Get the last device for this year
-        last_device = Device.objects.filter(
-            device_id__startswith=f"{year}-"
-        ).order_by('device_id').last()
 
-        if last_device:
-            # Extract the number and increment
-            last_number = int(last_device.device_id.split('-')[1])
-            new_number = last_number + 1
-        else:
-            # First device of the year
-            new_number = 1
+class ArchivedDevice(AbstractDevice):
+    """
+    A finished device moved out of the device table by archive_devices.
+
+    Keeps the primary key it had as a Device, so its status events still
+    point at it. The archive is only read: listed and searched when the
+    dashboard includes it, and shown by device_detail.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    intaker = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='archived_devices',
+        help_text="User who registered this device"
+    )
+    # Copied from the device, not set on save
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
 
-        return f"{year}-{new_number:04d}"
+    is_archived = True
 
-    def days_in_repair(self):
-        """Calculate how many days the device has been in the system"""
-        if self.date_finished:
-            end_date = self.date_finished
-        else:
-            end_date = timezone.now()
+    class Meta:
+        ordering = ['-intake_datetime']
+        # The dashboard sort orders, for listings that include the archive
+        indexes = [
+            models.Index(fields=['intake_datetime', 'device_id'], name='archived_intake_idx'),
+            models.Index(fields=['status', 'device_id'], name='archived_status_idx'),
+            models.Index(fields=['status', 'intake_datetime', 'device_id'], name='archived_status_intake_idx'),
+            models.Index(fields=['intaker', 'intake_datetime', 'device_id'], name='archived_intaker_intake_idx'),
+            models.Index(fields=['customer_name', 'device_id'], name='archived_customer_idx'),
+            models.Index(fields=['device_type', 'device_id'], name='archived_type_idx'),
+        ]
 
-        delta = end_date - self.intake_datetime
-        return delta.days
+    @classmethod
+    def from_device(cls, device):
+        """An unsaved archive copy of a device"""
+        values = {field.attname: getattr(device, field.attname) for field in AbstractDevice._meta.fields}
+        return cls(id=device.pk, **values)
 
-    def needs_reminder(self, days_threshold=7):
-        """Check if device needs a reminder (been in system too long)"""
-        if self.status in ['repaired', 'not_repaired', 'free_for_recycling']:
-            return False
 
-        return self.days_in_repair() >= days_threshold
+class DeviceStatusEvent(models.Model):
+    """
+    A status a device was given, and when (append-only).
+
+    Device.save() adds one whenever it writes a new status, and an intake
+    event for new devices. Devices created with bulk_create (imports, seed
+    data) get synthetic events from the backfill_status_events command.
+    """
+    device = models.ForeignKey(
+        Device,
+        on_delete=models.CASCADE,
+        related_name='status_events',
+        db_index=False,  # Covered by status_event_device_idx
+        # Archived devices keep their events (see ArchivedDevice), so the
+        # database must not require the device row to exist
+        db_constraint=False,
+    )
+    previous_status = models.CharField(max_length=20, choices=Device.STATUS_CHOICES, blank=True)
+    status = models.CharField(max_length=20, choices=Device.STATUS_CHOICES)
+    timestamp = models.DateTimeField(default=timezone.now)
+    synthetic = models.BooleanField(
+        default=False, help_text="Reconstructed by backfill_status_events, not recorded when it happened"
+    )
+
+    class Meta:
+        ordering = ['timestamp', 'id']
+        indexes = [
+            # A device's history, and time spent per status for analytics
+            models.Index(fields=['device', 'timestamp'], name='status_event_device_idx'),
+            models.Index(fields=['status', 'timestamp'], name='status_event_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id}: {self.previous_status or '-'} -> {self.status} at {self.timestamp}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Status events are append-only and cannot be changed.')
+        super().save(*args, **kwargs)
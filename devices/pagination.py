@@ -0,0 +1,275 @@
+"""
+Keyset (cursor) pagination for device listings.
+
+Instead of OFFSET/LIMIT, each page is fetched with a WHERE clause that seeks
+past the last row of the previous page, so the cost of a page does not grow
+with the size of the table. Rows are ordered by the requested sort key with
+``device_id`` as a unique tie-breaker, which keeps cursors stable.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Collate
+from django.utils.dateparse import parse_datetime
+
+# Unique column used to break ties between rows with the same sort value
+TIE_BREAKER = 'device_id'
+
+# Sort keys that may be NULL (e.g. devices whose intaker was deleted)
+NULLABLE_SORTS = {'intaker__username'}
+
+# Sort keys that hold datetimes and need (de)serialising in cursors
+DATETIME_SORTS = {'intake_datetime'}
+
+# Sort keys that hold text, which a database may order differently from Python
+TEXT_SORTS = {'device_id', 'customer_name', 'device_type', 'status', 'intaker__username'}
+
+# Annotation name used for sort keys that need a NULL-safe or collated expression
+SORT_ALIAS = 'keyset_sort_value'
+
+# Annotation name used for the tie-breaker when it needs a collated expression
+TIE_ALIAS = 'keyset_tie_value'
+
+
+class CodePointOrder(Collate):
+    """
+    Text compared by code point, the way Python compares str: the "C"
+    collation on PostgreSQL. SQLite already compares text that way, and
+    other databases use the column's collation as it is.
+    """
+
+    def __init__(self, expression):
+        super().__init__(expression, 'C')
+
+    def as_sql(self, compiler, connection, **extra_context):
+        if connection.vendor != 'postgresql':
+            return compiler.compile(self.get_source_expressions()[0])
+        return super().as_sql(compiler, connection, **extra_context)
+
+
+def encode_cursor(sort_by, value, tie):
+    """Encode a position in a listing as an opaque, URL-safe cursor string."""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = json.dumps([sort_by, value, tie], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_by):
+    """
+    Decode a cursor created by encode_cursor().
+
+    Returns a (value, tie) tuple, or None if the cursor is malformed or was
+    created for a different sort order.
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, tie = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        return None
+
+    if cursor_sort != sort_by or not isinstance(tie, str):
+        return None
+
+    if sort_by.lstrip('-') in DATETIME_SORTS:
+        value = parse_datetime(value) if isinstance(value, str) else None
+        if value is None:
+            return None
+
+    return value, tie
+
+
+class KeysetPage:
+    """A single page of results together with cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a Device queryset by seeking on (sort key, device_id).
+
+    Args:
+        queryset: The filtered queryset to paginate
+        sort_by: One of the dashboard sort keys, optionally prefixed with '-'
+        page_size: Maximum number of rows per page
+        code_point_order: Order text by code point (CodePointOrder) rather
+            than by the database collation
+    """
+
+    def __init__(self, queryset, sort_by, page_size, code_point_order=False):
+        self.sort_by = sort_by
+        self.field = sort_by.lstrip('-')
+        self.descending = sort_by.startswith('-')
+        self.page_size = page_size
+
+        self.tie = TIE_BREAKER
+        if code_point_order:
+            self.tie = TIE_ALIAS
+            queryset = queryset.annotate(**{TIE_ALIAS: CodePointOrder(F(TIE_BREAKER))})
+
+        if self.field == TIE_BREAKER:
+            self.key = self.tie
+            self.queryset = queryset
+            return
+
+        expression = None
+        if self.field in NULLABLE_SORTS:
+            # Sort missing values as empty strings so NULL ordering is the same on every database
+            expression = Coalesce(F(self.field), Value(''))
+        if code_point_order and self.field in TEXT_SORTS:
+            expression = CodePointOrder(expression or F(self.field))
+
+        if expression is not None:
+            self.key = SORT_ALIAS
+            self.queryset = queryset.annotate(**{SORT_ALIAS: expression})
+        else:
+            self.key = self.field
+            self.queryset = queryset
+
+    def page(self, after=None, before=None):
+        """
+        Return the page following the `after` cursor, or preceding the
+        `before` cursor. Without a (valid) cursor the first page is returned.
+        """
+        queryset, forward, position = self._page_queryset(after, before)
+        return self._make_page(list(queryset), forward, position)
+
+    async def apage(self, after=None, before=None):
+        """Async version of page(), for async views"""
+        queryset, forward, position = self._page_queryset(after, before)
+        return self._make_page([row async for row in queryset], forward, position)
+
+    def _page_queryset(self, after, before):
+        """The query fetching one row more than a page, with its direction and start position"""
+        after = decode_cursor(after, self.sort_by)
+        before = decode_cursor(before, self.sort_by) if after is None else None
+
+        forward = before is None
+        position = after if forward else before
+
+        queryset = self.queryset.order_by(*self._ordering(forward))
+        if position is not None:
+            queryset = queryset.filter(self._seek(*position, forward=forward))
+
+        return queryset[:self.page_size + 1], forward, position
+
+    def _make_page(self, rows, forward, position):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+
+        has_next = has_more if forward else True
+        has_previous = position is not None if forward else has_more
+
+        return KeysetPage(
+            rows,
+            next_cursor=self._cursor_for(rows[-1]) if has_next else None,
+            previous_cursor=self._cursor_for(rows[0]) if has_previous else None,
+        )
+
+    def _ordering(self, forward):
+        """ORDER BY terms for fetching in display order (forward) or reversed"""
+        descending = self.descending == forward
+        prefix = '-' if descending else ''
+        if self.key == self.tie:
+            return [f'{prefix}{self.tie}']
+        return [f'{prefix}{self.key}', f'{prefix}{self.tie}']
+
+    def _seek(self, value, tie, forward):
+        """WHERE clause selecting rows strictly past (value, tie) in fetch order"""
+        lookup = 'lt' if self.descending == forward else 'gt'
+        if self.key == self.tie:
+            return Q(**{f'{self.tie}__{lookup}': tie})
+        # The first condition is implied by the others, but without it the
+        # database walks the sort index from the start instead of seeking to `value`
+        return Q(**{f'{self.key}__{lookup}e': value}) & (
+            Q(**{f'{self.key}__{lookup}': value}) |
+            Q(**{self.key: value, f'{self.tie}__{lookup}': tie})
+        )
+
+    def _cursor_for(self, device):
+        if self.key == self.tie:
+            value = None
+        else:
+            value = getattr(device, self.key)
+        return encode_cursor(self.sort_by, value, getattr(device, TIE_BREAKER))
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """
+    Keyset pagination over several querysets sorted the same way, such as
+    the device table and the archive.
+
+    Each queryset is paged as if it were the only one (one query each), and
+    the rows are merged in Python. device_id must be unique across the
+    querysets, so cursors work for all of them. Python compares text by code
+    point, so each query orders and seeks text in code point order too,
+    whatever the database collation (see CodePointOrder). On PostgreSQL the
+    archive has indexes for that order (migration 0010); the device table
+    holds only recent devices, so sorting it is cheap.
+    """
+
+    def __init__(self, querysets, sort_by, page_size):
+        self.paginators = [
+            KeysetPaginator(queryset, sort_by, page_size, code_point_order=True) for queryset in querysets
+        ]
+        super().__init__(querysets[0], sort_by, page_size, code_point_order=True)
+
+    def page(self, after=None, before=None):
+        rows = []
+        for paginator in self.paginators:
+            queryset, forward, position = paginator._page_queryset(after, before)
+            rows.extend(queryset)
+        return self._make_page(self._merge(rows, forward), forward, position)
+
+    async def apage(self, after=None, before=None):
+        rows = []
+        for paginator in self.paginators:
+            queryset, forward, position = paginator._page_queryset(after, before)
+            rows.extend([row async for row in queryset])
+        return self._make_page(self._merge(rows, forward), forward, position)
+
+    def _merge(self, rows, forward):
+        """The first rows of all querysets together, in fetch order"""
+        rows.sort(key=self._sort_key, reverse=self.descending == forward)
+        return rows[:self.page_size + 1]
+
+    def _sort_key(self, row):
+        if self.key == self.tie:
+            return getattr(row, TIE_BREAKER)
+        return getattr(row, self.key), getattr(row, TIE_BREAKER)
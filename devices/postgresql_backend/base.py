@@ -0,0 +1,103 @@
+"""
+PostgreSQL backend with psycopg 3 connection pooling: Django's, plus the
+"pool" option Django only gained in 5.1, with the same name and meaning, so
+the settings keep working once this backend is dropped for
+django.db.backends.postgresql.
+
+OPTIONS["pool"] is True or a dict of psycopg_pool.ConnectionPool arguments
+(min_size, max_size, max_idle, max_lifetime, timeout, ...). Each process
+keeps one pool per database alias, opened on first use (after gunicorn has
+forked its workers). Django "closes" its connection at the end of every
+request as usual, which hands it back to the pool instead. Needs psycopg 3
+with the pool package (poetry install --extras pool) and
+CONN_MAX_AGE = 0; CONN_HEALTH_CHECKS makes the pool check connections before
+handing them out.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from django.utils.asyncio import async_unsafe
+
+from .creation import DatabaseCreation
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    _connection_pools = {}
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+
+        if self.alias not in self._connection_pools:
+            if self.settings_dict['CONN_MAX_AGE'] != 0:
+                raise ImproperlyConfigured("Pooling doesn't support persistent connections; set CONN_MAX_AGE to 0.")
+            if pool_options is True:
+                pool_options = {}
+            try:
+                if not is_psycopg3:
+                    raise ImportError
+                from psycopg_pool import ConnectionPool
+            except ImportError as err:
+                raise ImproperlyConfigured(
+                    'Connection pooling needs psycopg 3 and psycopg_pool; install "psycopg[binary,pool]".'
+                ) from err
+
+            connect_kwargs = self.get_connection_params()
+            # Django switches autocommit on or off itself once connected
+            connect_kwargs['autocommit'] = True
+            pool = ConnectionPool(
+                kwargs=connect_kwargs,
+                open=False,  # Not while importing; on the first request of the process
+                check=ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                **pool_options,
+            )
+            # Threads racing to create the pool: the first one wins
+            self._connection_pools.setdefault(self.alias, pool)
+
+        return self._connection_pools[self.alias]
+
+    def close_pool(self):
+        if self.pool:
+            self.pool.close()
+            del self._connection_pools[self.alias]
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        pool.open()
+        connection = pool.getconn()
+        # The isolation level, as Django's get_new_connection() sets it
+        options = self.settings_dict['OPTIONS']
+        if 'isolation_level' not in options:
+            self.isolation_level = IsolationLevel.READ_COMMITTED
+            return connection
+        try:
+            self.isolation_level = IsolationLevel(options['isolation_level'])
+        except ValueError:
+            pool.putconn(connection)
+            raise ImproperlyConfigured(
+                f"Invalid transaction isolation level {options['isolation_level']} "
+                f"specified. Use one of the psycopg.IsolationLevel values."
+            )
+        connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None and self.pool:
+            with self.wrap_database_errors:
+                # Back to the pool, which rolls back anything left open
+                self.pool.putconn(self.connection)
+            return
+        return super()._close()
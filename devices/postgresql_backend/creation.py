@@ -0,0 +1,12 @@
+from django.db import connections
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections, of this alias and of its test mirrors, would keep
+        # the test database in use
+        for alias in list(self.connection._connection_pools):
+            connections[alias].close()
+            connections[alias].close_pool()
+        super()._destroy_test_db(test_database_name, verbosity)
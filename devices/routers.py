@@ -0,0 +1,121 @@
+"""
+Read replica routing.
+
+When ReplicaRouter is configured (DB_REPLICA_NAME is set), the read-heavy
+views listed in DB_REPLICA_VIEWS (the dashboard, reminders and device detail
+by default) read from the `replica` database, so wall displays and reporting
+do not compete with reception's intakes on the primary. Everything else,
+and every write, uses the primary.
+
+A replica lags behind the primary, so a session that has just written
+(an intake, a device update, a login) reads from the primary for the next
+DB_REPLICA_STICKY_SECONDS: the device detail page shown right after saving
+always has the change. Within one request, reads after a write use the
+primary too.
+
+ReplicaRoutingMiddleware keeps the state of the current request in a context
+variable, which the router consults; outside requests (management commands,
+signals from the shell) everything goes to the primary.
+"""
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Session key holding the time until which the session reads from the primary
+STICKY_SESSION_KEY = '_primary_reads_until'
+
+_current_routing = ContextVar('replica_routing', default=None)
+
+
+class RequestRouting:
+    """Routing state of one request"""
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """Reads of replica views go to the replica, unless the session or request has written"""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from the database their instance came from
+            return instance._state.db
+        routing = _current_routing.get()
+        if routing is not None and routing.use_replica and not routing.wrote:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track the routing state of each request: whether its view reads from the
+    replica, and whether it wrote, in which case the session reads from the
+    primary for a while. Must come after SessionMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if f'{ReplicaRouter.__module__}.{ReplicaRouter.__name__}' not in settings.DATABASE_ROUTERS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        if routing.wrote:
+            self.stick_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        # Queries run by sync_to_async in a thread see the same context variable
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        if routing.wrote:
+            await sync_to_async(self.stick_to_primary)(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _current_routing.get()
+        if routing is None or request.resolver_match.url_name not in settings.DB_REPLICA_VIEWS:
+            return None
+        # Looked up before the flag is set, so the session is read from the primary
+        routing.use_replica = request.session.get(STICKY_SESSION_KEY, 0) <= time.time()
+        return None
+
+    def stick_to_primary(self, request):
+        request.session[STICKY_SESSION_KEY] = time.time() + settings.DB_REPLICA_STICKY_SECONDS
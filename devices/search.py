@@ -0,0 +1,177 @@
+"""
+Device search for the dashboard search box.
+
+Matches the same substring semantics as a case-insensitive LIKE over the
+searchable columns, but takes an indexed path where the database has one:
+
+* PostgreSQL: the ``__icontains`` lookups are served by ``pg_trgm`` GIN
+  indexes on ``UPPER(column)`` (created in migration 0004).
+* SQLite: an FTS5 table using the trigram tokenizer, kept in sync with
+  ``devices_device`` by triggers on every insert, update and delete (also
+  created in migration 0004, and re-created after migrations that rebuild
+  the devices table).
+
+The archive table (``devices_archiveddevice``) has the same indexes, created
+in migration 0008.
+
+Any other database, or a query too short for trigrams, uses the plain
+``Q`` filter.
+"""
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ['device_id', 'customer_name', 'phone_number', 'device_type', 'brand_model']
+
+# Tables with search indexes
+DEVICE_TABLE = 'devices_device'
+ARCHIVE_TABLE = 'devices_archiveddevice'
+SEARCH_TABLES = [DEVICE_TABLE, ARCHIVE_TABLE]
+
+# Trigram indexes can only match queries of at least three characters
+MIN_TRIGRAM_LENGTH = 3
+
+# Annotation holding the relevance score of each search result
+RANK_FIELD = 'search_rank'
+
+_fts_available = {}
+
+
+def fts_table(table):
+    """Name of the SQLite FTS5 shadow table of a searchable table"""
+    return f'{table}_fts'
+
+
+def install_sqlite_fts(connection, table=DEVICE_TABLE):
+    """
+    Create the FTS5 shadow table of `table` and its sync triggers if they
+    are missing. Returns False if this SQLite build lacks FTS5 trigrams.
+    """
+    fts = fts_table(table)
+    columns = ', '.join(SEARCH_FIELDS)
+    new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+    old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+    delete_old = (
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"{columns}, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} "
+                f"BEGIN {insert_new} END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} "
+                f"BEGIN {delete_old} END"
+            )
+            # Only searchable columns, so status updates do not touch the index
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {columns} "
+                f"ON {table} BEGIN {delete_old} {insert_new} END"
+            )
+    except OperationalError:
+        return False
+
+    _fts_available.pop((connection.alias, table), None)
+    return True
+
+
+def install_search_indexes(sender, using, **kwargs):
+    """
+    post_migrate handler: SQLite migrations that rebuild a searchable table
+    drop its triggers, so make sure the FTS sync triggers still exist.
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        for table in SEARCH_TABLES:
+            # Migrations may have created or dropped the FTS table since it was last checked
+            _fts_available.pop((using, table), None)
+            if sqlite_fts_available(using, table):
+                install_sqlite_fts(connection, table=table)
+
+
+def get_search_backend(using, table=DEVICE_TABLE):
+    """Return the search backend name ('fts5', 'trigram' or 'basic') for a table in a database"""
+    backend = getattr(settings, 'DEVICE_SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return 'trigram'
+    if connection.vendor == 'sqlite' and sqlite_fts_available(using, table):
+        return 'fts5'
+    return 'basic'
+
+
+def sqlite_fts_available(using, table=DEVICE_TABLE):
+    """Check once per process whether the FTS5 shadow table of `table` exists"""
+    if (using, table) not in _fts_available:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [fts_table(table)]
+            )
+            _fts_available[using, table] = cursor.fetchone() is not None
+    return _fts_available[using, table]
+
+
+def basic_search_filter(query):
+    """Case-insensitive substring match over all searchable fields"""
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def fts_match_expression(query):
+    """Quote a user query as a single FTS5 phrase (substring match with trigrams)"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def search_devices(queryset, query):
+    """
+    Filter a Device (or ArchivedDevice) queryset by a search query and
+    annotate a relevance score.
+
+    Returns:
+        The filtered queryset, annotated with RANK_FIELD (higher is better).
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    table = queryset.model._meta.db_table
+    backend = get_search_backend(queryset.db, table)
+    if backend == 'fts5' and len(query) >= MIN_TRIGRAM_LENGTH:
+        fts = fts_table(table)
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s',
+            [fts_match_expression(query)],
+        ))
+    else:
+        # On PostgreSQL these lookups use the trigram GIN indexes
+        queryset = queryset.filter(basic_search_filter(query))
+
+    return queryset.annotate(**{RANK_FIELD: search_rank(query)})
+
+
+def search_rank(query):
+    """
+    Relevance score, evaluated only for matching rows: an exact device ID
+    (a barcode scan) ranks first, then ID prefixes, then name/phone prefixes.
+    """
+    return Case(
+        When(device_id__iexact=query, then=Value(3)),
+        When(device_id__istartswith=query, then=Value(2)),
+        When(Q(customer_name__istartswith=query) | Q(phone_number__istartswith=query), then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
@@ -0,0 +1,56 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_table_version
+from .events import device_event, publish_device_event
+from .intakers import adjust_intake_counts, forget_intaker_options
+from .lookup import forget_device
+from .models import Device, User
+from .stats import invalidate_archive_stats, invalidate_device_stats
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def device_changed(sender, instance, signal, using, **kwargs):
+    """
+    Drop cached statistics, dashboard tables and scan lookups whenever a
+    device is saved or deleted, and tell live dashboards, once the change is
+    committed. Invalidating earlier would let another worker cache the old
+    rows under the new version before the change becomes visible to it.
+    """
+    transaction.on_commit(invalidate_device_stats, using=using)
+    transaction.on_commit(bump_table_version, using=using)
+    transaction.on_commit(partial(forget_device, instance.device_id), using=using)
+
+    event = device_event(instance, 'deleted' if signal is post_delete else 'saved')
+    transaction.on_commit(partial(publish_device_event, event), using=using)
+
+
+@receiver(post_save, sender=Device)
+def count_saved_intake(sender, instance, created, update_fields, using, **kwargs):
+    """Count a new device for its intaker, or move it to another intaker's count"""
+    if created:
+        adjust_intake_counts({instance.intaker_id: 1}, using)
+    elif update_fields is None or 'intaker' in update_fields or 'intaker_id' in update_fields:
+        previous_intaker_id = instance.stored_value('intaker')
+        if previous_intaker_id != instance.intaker_id:
+            adjust_intake_counts({previous_intaker_id: -1, instance.intaker_id: 1}, using)
+
+
+@receiver(post_delete, sender=Device)
+def count_deleted_intake(sender, instance, using, **kwargs):
+    adjust_intake_counts({instance.intaker_id: -1}, using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, using, update_fields=None, **kwargs):
+    """Intaker names appear in the dashboard table and statistics, so user changes invalidate them too"""
+    if update_fields and set(update_fields) == {'last_login'}:
+        return  # Logging in changes nothing that is displayed
+    transaction.on_commit(bump_table_version, using=using)
+    transaction.on_commit(invalidate_archive_stats, using=using)
+    transaction.on_commit(forget_intaker_options, using=using)
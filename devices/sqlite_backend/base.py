@@ -0,0 +1,47 @@
+"""
+SQLite backend for production: Django's, plus the two connection options
+Django only gained in 5.1, with the same names and meaning, so the settings
+keep working once this backend is dropped for django.db.backends.sqlite3:
+
+- "init_command": SQL statements (separated by ";") run on every new
+  connection, e.g. PRAGMA journal_mode=WAL.
+- "transaction_mode": DEFERRED, IMMEDIATE or EXCLUSIVE, the kind of BEGIN
+  that starts each transaction.
+
+IMMEDIATE matters under several worker processes. A DEFERRED transaction
+that reads before it writes has to upgrade its lock; when another
+connection is already writing, SQLite fails that upgrade with "database
+is locked" at once instead of waiting the busy timeout. An IMMEDIATE
+transaction takes the write lock when it begins, where it does wait.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    transaction_modes = frozenset(['DEFERRED', 'EXCLUSIVE', 'IMMEDIATE'])
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.init_commands = kwargs.pop('init_command', '').split(';')
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in self.transaction_modes:
+            raise ImproperlyConfigured(
+                f'settings.DATABASES["{self.alias}"]["OPTIONS"]["transaction_mode"] is improperly '
+                f'configured to {transaction_mode!r}; use one of {", ".join(sorted(self.transaction_modes))}.'
+            )
+        self.transaction_mode = transaction_mode.upper() if transaction_mode else None
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for init_command in self.init_commands:
+            if init_command := init_command.strip():
+                conn.execute(init_command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
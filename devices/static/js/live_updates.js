@@ -0,0 +1,61 @@
+// Live dashboard updates: patch device rows in place when a device changes
+// elsewhere (e.g. at the repair station), instead of reloading the page.
+(function () {
+    var script = document.currentScript;
+    var table = document.getElementById('device-table');
+    if (!window.EventSource || !script || !table) {
+        return;
+    }
+
+    var statusLabels = JSON.parse(document.getElementById('status-labels').textContent);
+    var source = new EventSource(script.dataset.eventsUrl);
+    var droppedConnection = false;
+
+    function findRow(deviceId) {
+        var rows = table.querySelectorAll('tr[data-device-id]');
+        for (var i = 0; i < rows.length; i++) {
+            if (rows[i].dataset.deviceId === deviceId) {
+                return rows[i];
+            }
+        }
+        return null;
+    }
+
+    function flash(row) {
+        row.classList.remove('row-updated');
+        void row.offsetWidth;  // Restart the highlight animation
+        row.classList.add('row-updated');
+    }
+
+    source.addEventListener('device', function (message) {
+        var event = JSON.parse(message.data);
+        var row = findRow(event.device_id);
+        if (!row) {
+            return;  // Not on this page
+        }
+
+        if (event.type === 'deleted') {
+            row.parentNode.removeChild(row);
+            return;
+        }
+
+        var badge = row.querySelector('[data-field="status"]');
+        if (badge) {
+            badge.className = 'status-badge status-' + event.status;
+            badge.textContent = statusLabels[event.status] || event.status;
+            badge.title = event.repairer_name || '';
+        }
+        flash(row);
+    });
+
+    source.addEventListener('error', function () {
+        droppedConnection = true;
+    });
+
+    source.addEventListener('open', function () {
+        // Changes made while disconnected were missed: fetch a fresh page
+        if (droppedConnection) {
+            window.location.reload();
+        }
+    });
+})();
@@ -0,0 +1,107 @@
+// Repair station scans: look devices up as JSON and fill in the device card,
+// instead of loading a whole page per scan. Without JavaScript, or when the
+// lookup fails unexpectedly, the form falls back to a normal page load. A
+// failed claim is not repeated that way, since it may have gone through.
+(function () {
+    var form = document.getElementById('scan-form');
+    var card = document.getElementById('device-card');
+    var error = document.getElementById('scan-error');
+    if (!form || !card || !window.fetch) {
+        return;
+    }
+
+    var input = form.querySelector('input[name="device_id"]');
+    var latestScan = 0;
+
+    function showDevice(device) {
+        card.querySelectorAll('[data-field]').forEach(function (element) {
+            element.textContent = device[element.dataset.field];
+        });
+        card.querySelectorAll('[data-optional]').forEach(function (element) {
+            element.hidden = !device[element.dataset.optional];
+        });
+        card.querySelectorAll('[data-link]').forEach(function (element) {
+            element.href = device[element.dataset.link];
+        });
+
+        var badge = card.querySelector('[data-field="status"]');
+        badge.className = 'status-badge status-' + device.status;
+        badge.textContent = device.status_display;
+
+        error.hidden = true;
+        card.hidden = false;
+    }
+
+    function showError(message) {
+        error.textContent = message;
+        error.hidden = false;
+        card.hidden = true;
+    }
+
+    // Show the device (or error) of a JSON response; anything else (e.g. logged
+    // out: redirected to the login page) calls `onFailure`.
+    // `query` is the address to keep, or null for that of the device shown.
+    function handleResponse(request, onFailure, query) {
+        var scan = ++latestScan;
+        request.then(function (response) {
+            var isJson = (response.headers.get('Content-Type') || '').indexOf('application/json') === 0;
+            if (!isJson || (!response.ok && response.status !== 404)) {
+                throw new Error('Request failed');
+            }
+            return response.json().then(function (data) {
+                if (scan !== latestScan) {
+                    return;
+                }
+                if (response.ok) {
+                    showDevice(data);
+                    query = query || '?device_id=' + encodeURIComponent(data.device_id);
+                } else {
+                    showError(data.error);
+                }
+                if (query) {
+                    // Keep the address in sync, so a reload shows the same device
+                    window.history.replaceState(null, '', form.action + query);
+                }
+                input.select();  // The next scan replaces the ID
+            });
+        }).catch(function () {
+            if (scan === latestScan) {
+                onFailure();
+            }
+        });
+    }
+
+    form.addEventListener('submit', function (event) {
+        var deviceId = input.value.trim();
+        if (!deviceId) {
+            return;
+        }
+        event.preventDefault();
+
+        // Scanners fire in bursts: only the answer to the latest scan is shown
+        var query = '?device_id=' + encodeURIComponent(deviceId);
+        handleResponse(fetch(form.dataset.lookupUrl + query, {
+            headers: {'Accept': 'application/json'},
+            credentials: 'same-origin'
+        }), function () {
+            form.submit();
+        }, query);
+    });
+
+    var claimForm = document.getElementById('claim-form');
+    if (claimForm) {
+        claimForm.addEventListener('submit', function (event) {
+            event.preventDefault();
+            handleResponse(fetch(claimForm.action, {
+                method: 'POST',
+                headers: {
+                    'Accept': 'application/json',
+                    'X-CSRFToken': claimForm.querySelector('input[name="csrfmiddlewaretoken"]').value
+                },
+                credentials: 'same-origin'
+            }), function () {
+                showError(claimForm.dataset.failedMessage);
+            }, null);
+        });
+    }
+})();
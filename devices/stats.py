@@ -0,0 +1,202 @@
+"""
+Aggregate device statistics for the dashboard and wall displays.
+
+All numbers are derived from one grouped query over (status, intaker,
+days in repair), so the cost depends on the number of distinct groups
+rather than the number of devices. Results are cached for a short time and
+the cache is cleared whenever a device is saved or deleted.
+
+Archived devices are counted too. They never change, so their groups are
+cached until archive_devices moves more devices into the archive.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections
+from django.db.models import Count, DateTimeField, F, Func, IntegerField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedDevice, Device
+
+STATS_CACHE_KEY = 'devices:stats'
+ARCHIVE_STATS_CACHE_KEY = 'devices:stats:archive'
+
+# Age buckets for devices still in repair: (label, first day, last day or None)
+AGE_BUCKETS = [
+    ('0-6', 0, 6),
+    ('7-13', 7, 13),
+    ('14-29', 14, 29),
+    ('30+', 30, None),
+]
+
+MICROSECONDS_PER_DAY = 86400 * 1000000
+
+# More days than any device can be finished before its intake (see DaysInRepair.as_sqlite)
+DAYS_SHIFT = 100000
+
+
+class DaysInRepair(Func):
+    """
+    Whole days between intake and finish (or `now` for unfinished devices),
+    the database-side equivalent of Device.days_in_repair().
+
+    Only SQLite and PostgreSQL are supported; grouped_counts() counts the
+    days in Python on other backends.
+    """
+    output_field = IntegerField()
+    vendors = {'sqlite', 'postgresql'}
+
+    def __init__(self, now, **extra):
+        end = Coalesce('date_finished', Value(now, output_field=DateTimeField()))
+        super().__init__(end, F('intake_datetime'), **extra)
+
+    def _compile_arguments(self, compiler, connection):
+        """[(sql, params)] of the end and the start"""
+        return [compiler.compile(expression) for expression in self.get_source_expressions()]
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f'DaysInRepair is not supported on {connection.vendor}.')
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # julianday() is a float with millisecond precision, so compute in
+        # microseconds instead: whole seconds from strftime() (of the value
+        # without its fraction, which strftime() would round) plus the
+        # microseconds Django stores after them ('YYYY-MM-DD HH:MM:SS[.ffffff]')
+        (end, end_params), (start, start_params) = self._compile_arguments(compiler, connection)
+
+        def microseconds(sql):
+            return (
+                f"(CAST(strftime('%%s', substr({sql}, 1, 19)) AS INTEGER) * 1000000"
+                f" + CAST(substr({sql} || '.000000', 21, 6) AS INTEGER))"
+            )
+
+        difference = f'({microseconds(end)} - {microseconds(start)})'
+        # Integer division truncates towards zero. Shifting the difference by
+        # a whole number of days makes any plausible one positive, so that it
+        # floors like timedelta.days, with the difference computed only once.
+        return (
+            f'({difference} + {DAYS_SHIFT * MICROSECONDS_PER_DAY}) / {MICROSECONDS_PER_DAY} - {DAYS_SHIFT}',
+            [*end_params, *end_params, *start_params, *start_params],
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        (end, end_params), (start, start_params) = self._compile_arguments(compiler, connection)
+        return f'FLOOR(EXTRACT(EPOCH FROM ({end} - {start})) / 86400)::integer', [*end_params, *start_params]
+
+
+def percentile(histogram, total, fraction):
+    """Nearest-rank percentile from a {value: count} histogram"""
+    if not total:
+        return None
+    rank = max(1, math.ceil(total * fraction))
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return None
+
+
+GROUP_FIELDS = ['status', 'intaker_id', 'intaker__username', 'intaker__first_name', 'intaker__last_name']
+
+
+def grouped_counts(model, using=None):
+    """Device counts grouped by status, intaker and days in repair"""
+    queryset = model.objects.using(using).order_by()
+    now = timezone.now()
+    if connections[queryset.db].vendor not in DaysInRepair.vendors:
+        return python_grouped_counts(queryset, now)
+    return queryset.annotate(
+        days=DaysInRepair(now),
+    ).values(*GROUP_FIELDS, 'days').annotate(count=Count('id'))
+
+
+def python_grouped_counts(queryset, now):
+    """grouped_counts() for backends without DaysInRepair, counting the days in Python"""
+    counts = Counter()
+    rows = queryset.values_list(*GROUP_FIELDS, 'intake_datetime', 'date_finished')
+    for *group, intake_datetime, date_finished in rows.iterator():
+        # Same as Device.days_in_repair()
+        days = ((date_finished or now) - intake_datetime).days
+        counts[(*group, days)] += 1
+    return [
+        {**dict(zip([*GROUP_FIELDS, 'days'], group)), 'count': count}
+        for group, count in counts.items()
+    ]
+
+
+def archive_grouped_counts():
+    """grouped_counts() of the archive, cached until invalidate_archive_stats()"""
+    rows = cache.get(ARCHIVE_STATS_CACHE_KEY)
+    if rows is None:
+        # Never from a read replica, which may not have the latest archiving yet
+        rows = list(grouped_counts(ArchivedDevice, using=DEFAULT_DB_ALIAS))
+        cache.set(ARCHIVE_STATS_CACHE_KEY, rows, None)
+    return rows
+
+
+def compute_device_stats():
+    """Compute device statistics with a single grouped query (plus the cached archive groups)"""
+    rows = [*grouped_counts(Device), *archive_grouped_counts()]
+
+    by_status = {value: 0 for value, _ in Device.STATUS_CHOICES}
+    by_intaker = {}
+    days_histogram = {}
+    age_buckets = {label: 0 for label, _, _ in AGE_BUCKETS}
+    total = 0
+
+    for row in rows:
+        count = row['count']
+        total += count
+        by_status[row['status']] = by_status.get(row['status'], 0) + count
+        days_histogram[row['days']] = days_histogram.get(row['days'], 0) + count
+
+        intaker = by_intaker.setdefault(row['intaker_id'], {
+            'id': row['intaker_id'],
+            'username': row['intaker__username'],
+            'name': ' '.join(filter(None, [row['intaker__first_name'], row['intaker__last_name']])),
+            'count': 0,
+        })
+        intaker['count'] += count
+
+        if row['status'] in Device.ACTIVE_STATUSES:
+            for label, first_day, last_day in AGE_BUCKETS:
+                if row['days'] >= first_day and (last_day is None or row['days'] <= last_day):
+                    age_buckets[label] += count
+                    break
+
+    finished = sum(by_status.get(status, 0) for status in Device.FINAL_STATUSES)
+
+    return {
+        'total': total,
+        'by_status': by_status,
+        'by_intaker': sorted(by_intaker.values(), key=lambda intaker: -intaker['count']),
+        'active_by_age': age_buckets,
+        'days_in_repair': {
+            'median': percentile(days_histogram, total, 0.5),
+            'p90': percentile(days_histogram, total, 0.9),
+        },
+        # Share of finished devices that were actually repaired
+        'repair_success_rate': round(by_status.get('repaired', 0) / finished, 4) if finished else None,
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+def get_device_stats():
+    """Device statistics, cached for DEVICE_STATS_CACHE_TTL seconds"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_device_stats()
+        cache.set(STATS_CACHE_KEY, stats, settings.DEVICE_STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_device_stats():
+    cache.delete(STATS_CACHE_KEY)
+
+
+def invalidate_archive_stats():
+    cache.delete_many([STATS_CACHE_KEY, ARCHIVE_STATS_CACHE_KEY])
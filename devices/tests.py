@@ -0,0 +1,486 @@
+"""
+Tests for the devices app.
+"""
+import re
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from barcode.charsets import code128
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .barcode_utils import BARCODE_OPTIONS, render_barcode_svg
+from .exports import export_lines
+from .filters import DASHBOARD_SORTS, DeviceFilter
+from .models import ArchivedDevice, Device, DeviceConflictError, DeviceIdCounter, User, format_device_id
+from .pagination import KeysetPaginator, MergedKeysetPaginator
+from .routers import REPLICA_DB_ALIAS
+from .stats import DaysInRepair
+
+
+def create_device(**fields):
+    return Device.objects.create(**{
+        'customer_name': 'Test Klant',
+        'phone_number': '0612345678',
+        'device_type': 'Radio',
+        'brand_model': 'Philips AE5430',
+        'problem_description': 'Gaat niet meer aan.',
+        **fields,
+    })
+
+
+class KeysetPaginationTests(TestCase):
+    """Following the cursors forwards and backwards lists every device once, in order, for every sort"""
+
+    @classmethod
+    def setUpTestData(cls):
+        intakers = [None, *(User.objects.create_user(name) for name in ['anna', 'Bert', 'cees'])]
+        now = timezone.now().replace(microsecond=0)
+        for number in range(30):
+            create_device(
+                customer_name=['Jansen', 'de Vries', 'Émile', 'Bakker'][number % 4],
+                device_type=['Radio', 'radio', 'Lamp'][number % 3],
+                status=[status for status, _ in Device.STATUS_CHOICES][number % 5],
+                intake_datetime=now - timedelta(hours=number % 7),
+                intaker=intakers[number % 4],
+            )
+
+    def walk(self, paginator):
+        """The device IDs of all pages following next_cursor, and following previous_cursor back"""
+        forward, page = [], paginator.page()
+        while True:
+            forward.extend(device.device_id for device in page)
+            if not page.has_next:
+                break
+            page = paginator.page(after=page.next_cursor)
+
+        backward = []
+        while True:
+            backward[:0] = [device.device_id for device in page]
+            if not page.has_previous:
+                break
+            page = paginator.page(before=page.previous_cursor)
+        return forward, backward
+
+    def assertWalks(self, paginator, expected):
+        forward, backward = self.walk(paginator)
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+
+    def test_keyset_paginator(self):
+        for sort in DASHBOARD_SORTS:
+            with self.subTest(sort=sort):
+                paginator = KeysetPaginator(Device.objects.all(), sort, 4)
+                expected = paginator.queryset.order_by(*paginator._ordering(True))
+                self.assertWalks(paginator, [device.device_id for device in expected])
+
+    def test_merged_paginator(self):
+        devices = list(Device.objects.order_by('pk')[::2])
+        ArchivedDevice.objects.bulk_create([ArchivedDevice.from_device(device) for device in devices])
+        Device.objects.filter(pk__in=[device.pk for device in devices]).delete()
+
+        for sort in DASHBOARD_SORTS:
+            with self.subTest(sort=sort):
+                querysets = DeviceFilter(sort=sort, include_archive=True).querysets()
+                paginator = MergedKeysetPaginator(querysets, sort, 4)
+                rows = [row for part in paginator.paginators for row in part.queryset]
+                rows.sort(key=paginator._sort_key, reverse=paginator.descending)
+                self.assertWalks(paginator, [row.device_id for row in rows])
+
+
+class ReminderTests(TestCase):
+    """needing_reminder() selects exactly the devices for which needs_reminder() is True"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        threshold = timedelta(days=Device.REMINDER_THRESHOLD_DAYS)
+        # Unfinished devices a minute either side of the threshold, so the
+        # test does not depend on how long it takes to run
+        intake_ages = [timedelta(0), threshold - timedelta(minutes=1), threshold + timedelta(minutes=1), timedelta(days=40)]
+        # Finished after exactly the threshold, just under it, and well over it
+        repair_times = [threshold, threshold - timedelta(seconds=1), timedelta(days=30)]
+
+        for status, _ in Device.STATUS_CHOICES:
+            for age in intake_ages:
+                create_device(status=status, intake_datetime=now - age)
+            for repair_time in repair_times:
+                intake = now - timedelta(days=60)
+                create_device(status=status, intake_datetime=intake, date_finished=intake + repair_time)
+
+    def assertMatchesPython(self, queryset, days_threshold=Device.REMINDER_THRESHOLD_DAYS):
+        expected = {device.pk for device in queryset if device.needs_reminder(days_threshold)}
+        self.assertTrue(expected)
+        self.assertEqual(set(queryset.needing_reminder(days_threshold).values_list('pk', flat=True)), expected)
+
+    def test_all_devices(self):
+        self.assertMatchesPython(Device.objects.all())
+
+    def test_active_devices(self):
+        self.assertMatchesPython(Device.objects.active())
+
+    def test_other_threshold(self):
+        self.assertMatchesPython(Device.objects.all(), days_threshold=3)
+        self.assertMatchesPython(Device.objects.all(), days_threshold=35)
+
+    def test_reminders_pages(self):
+        """Following the Next links lists every device needing a reminder once, longest waiting first"""
+        self.client.force_login(User.objects.create_user('operator', password='test'))
+        expected = list(Device.objects.active().needing_reminder().order_by('intake_datetime', 'device_id'))
+
+        listed = []
+        url = reverse('reminders') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.context['count'], len(expected))
+            listed.extend(response.context['devices'])
+            next_url = response.context['next_url']
+            url = reverse('reminders') + next_url if next_url else None
+        self.assertEqual(listed, expected)
+
+
+class DeviceIdConcurrencyTests(TransactionTestCase):
+    """Devices saved from many threads at once never get the same device ID"""
+
+    threads = 8
+    devices_per_thread = 10
+
+    def test_unique_device_ids(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Connections to the in-memory database share one cache, whose
+            # table locks fail at once instead of waiting like file locks
+            self.skipTest('needs a file test database on SQLite (set DB_TEST_NAME)')
+        start_together = threading.Barrier(self.threads)
+
+        def intake(number):
+            start_together.wait()
+            try:
+                return [
+                    create_device(customer_name=f'Klant {number}-{index}').device_id
+                    for index in range(self.devices_per_thread)
+                ]
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            device_ids = [device_id for batch in pool.map(intake, range(self.threads)) for device_id in batch]
+
+        total = self.threads * self.devices_per_thread
+        year = timezone.now().year
+        self.assertEqual(len(set(device_ids)), total)
+        # No numbers skipped either
+        self.assertEqual(set(device_ids), {format_device_id(year, number) for number in range(1, total + 1)})
+        self.assertEqual(DeviceIdCounter.objects.get(year=year).last_number, total)
+
+
+def decode_code128(modules):
+    """Decode a string of Code128 modules ('1' dark, '0' light) back to text"""
+    values = {pattern: value for value, pattern in enumerate(code128.CODES)}
+    assert modules.endswith(code128.STOP + '11'), 'missing stop pattern'
+    symbols = [values[modules[offset:offset + 11]] for offset in range(0, len(modules) - 13, 11)]
+
+    start, *data, checksum = symbols
+    assert checksum == (start + sum(position * value for position, value in enumerate(data, start=1))) % 103
+
+    # Device IDs only need code sets B (ASCII) and C (pairs of digits)
+    charset = {code128.START_CODES['B']: 'B', code128.START_CODES['C']: 'C'}[start]
+    switches = {
+        'B': {code128.B['TO_C']: 'C'},
+        'C': {code128.C['TO_B']: 'B'},
+    }
+    text = ''
+    for value in data:
+        if value in switches[charset]:
+            charset = switches[charset][value]
+        elif charset == 'C':
+            text += f'{value:02d}'
+        else:
+            text += chr(value + 32)
+    return text
+
+
+def svg_modules(svg):
+    """The Code128 modules drawn by render_barcode_svg(), read back from its path"""
+    module_width = BARCODE_OPTIONS['module_width']
+    quiet_zone = BARCODE_OPTIONS['quiet_zone']
+    width = float(re.search(r'viewBox="0 0 ([\d.]+) ', svg).group(1))
+    modules = ['0'] * round((width - 2 * quiet_zone) / module_width)
+    for x, bar_width in re.findall(r'M([\d.]+) [\d.]+h([\d.]+)', svg):
+        first = round((float(x) - quiet_zone) / module_width)
+        modules[first:first + round(float(bar_width) / module_width)] = '1' * round(float(bar_width) / module_width)
+    return ''.join(modules)
+
+
+class BarcodeTests(TestCase):
+    """The SVG barcode decodes back to the device ID, and is revalidated by its ETag"""
+
+    def test_svg_round_trip(self):
+        for device_id in ['2025-0042', '2025-0001', '2026-12345', '1999-9999', 'TEST-ab']:
+            with self.subTest(device_id=device_id):
+                svg = render_barcode_svg(device_id).decode('utf-8')
+                self.assertEqual(decode_code128(svg_modules(svg)), device_id)
+                self.assertIn(f'>{device_id}</text>', svg)
+
+    def test_svg_without_text(self):
+        svg = render_barcode_svg('2025-0042', {'write_text': False}).decode('utf-8')
+        self.assertNotIn('<text', svg)
+        self.assertEqual(decode_code128(svg_modules(svg)), '2025-0042')
+
+    def test_revalidation(self):
+        device = create_device()
+        client = Client()
+        client.force_login(User.objects.create_user('barcode', password='test'))
+        url = reverse('device_barcode_svg', args=[device.device_id])
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        device.delete()
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 404)
+
+
+class ExportTests(TestCase):
+    """Exports stream rows, so memory use does not grow with the number of devices"""
+
+    def create_devices(self, count):
+        """Add devices until there are `count`"""
+        now = timezone.now()
+        Device.objects.bulk_create(
+            Device(
+                device_id=format_device_id(2000, index),
+                intake_datetime=now,
+                customer_name=f'Klant {index}',
+                phone_number='0612345678',
+                device_type='Radio',
+                brand_model='Philips AE5430',
+                problem_description='Gaat niet meer aan. ' * 10,
+            )
+            for index in range(Device.objects.count(), count)
+        )
+
+    def export_peak(self, export_format):
+        """Peak memory allocated while exporting all devices, in bytes, and the number of lines"""
+        tracemalloc.start()
+        try:
+            lines = 0
+            for _ in export_lines([Device.objects.order_by('device_id')], export_format, chunk_size=100):
+                lines += 1
+            return tracemalloc.get_traced_memory()[1], lines
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory_does_not_grow_with_devices(self):
+        formats = {'csv': 1, 'ndjson': 0}  # Header lines
+
+        self.create_devices(500)
+        small_peaks = {}
+        for export_format, header_lines in formats.items():
+            small_peaks[export_format], lines = self.export_peak(export_format)
+            self.assertEqual(lines, 500 + header_lines)
+
+        self.create_devices(5000)
+        for export_format, header_lines in formats.items():
+            with self.subTest(export_format=export_format):
+                peak, lines = self.export_peak(export_format)
+                self.assertEqual(lines, 5000 + header_lines)
+                # Ten times the devices; holding all rows would take several times the memory
+                self.assertLess(peak, small_peaks[export_format] * 2)
+
+
+class DaysInRepairTests(TestCase):
+    """DaysInRepair counts the same whole days as days_in_repair(), also around day boundaries"""
+
+    def test_day_boundaries(self):
+        now = timezone.now()
+        durations = [
+            timedelta(days=days, microseconds=microseconds)
+            for days in (0, 1, 30)
+            for microseconds in (-999, -1, 0, 1, 999)
+        ]
+        devices = [
+            create_device(intake_datetime=intake_datetime, date_finished=intake_datetime + sign * duration)
+            for intake_datetime in (now.replace(microsecond=0), now.replace(microsecond=999999))
+            for duration in durations
+            for sign in (1, -1)
+        ]
+
+        days = dict(Device.objects.annotate(days=DaysInRepair(now)).values_list('pk', 'days'))
+        for device in devices:
+            with self.subTest(intake=device.intake_datetime, finished=device.date_finished):
+                self.assertEqual(days[device.pk], device.days_in_repair())
+
+
+class DashboardIndexTests(TestCase):
+    """The dashboard filters, sorts and reminders are served by their indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.intaker = User.objects.create_user('intaker', password='test')
+        # Mostly finished devices, as in a real database, so that the
+        # partial index on unfinished devices is worth using
+        now = timezone.now()
+        statuses = [status for status, _ in Device.STATUS_CHOICES]
+        Device.objects.bulk_create(
+            Device(
+                device_id=format_device_id(2000, number),
+                intake_datetime=now - timedelta(days=number),
+                intaker=cls.intaker if number % 2 else None,
+                customer_name=f'Klant {number}',
+                phone_number='0612345678',
+                device_type='Radio',
+                brand_model='Philips AE5430',
+                problem_description='Gaat niet meer aan.',
+                status=statuses[number % len(statuses)] if number < 20 else 'repaired',
+                date_finished=None if number < 20 else now,
+            )
+            for number in range(1, 1001)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # The test table is still small enough to be cheaper to scan
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                return queryset.explain()
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET enable_seqscan')
+        return queryset.explain()
+
+    def test_dashboard_indexes(self):
+        cases = [
+            ({'sort': '-intake_datetime'}, 'device_intake_idx'),
+            ({'sort': 'intake_datetime'}, 'device_intake_idx'),
+            ({'sort': 'status'}, 'device_status_idx'),
+            ({'status': 'open', 'sort': '-intake_datetime'}, 'device_status_intake_idx'),
+            ({'intaker': self.intaker.pk, 'sort': '-intake_datetime'}, 'device_intaker_intake_idx'),
+            ({'sort': 'customer_name'}, 'device_customer_idx'),
+            ({'sort': '-device_type'}, 'device_type_idx'),
+        ]
+        for filters, index in cases:
+            with self.subTest(**filters):
+                queryset = DeviceFilter(**filters).apply(Device.objects.all())[:50]
+                self.assertIn(index, self.plan(queryset))
+
+    def test_reminder_index(self):
+        self.assertIn('device_unfinished_idx', self.plan(Device.objects.active().needing_reminder()))
+
+
+class ConcurrentUpdateTests(TransactionTestCase):
+    """Optimistic locking loses no update when many threads edit the same device"""
+
+    threads = 8
+    updates = 25
+
+    def test_no_lost_updates(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a file test database on SQLite (set DB_TEST_NAME)')
+        device = create_device()
+        start_together = threading.Barrier(self.threads)
+
+        def writer(number):
+            start_together.wait()
+            try:
+                for update in range(self.updates):
+                    while True:
+                        # Read-modify-write, as two repairers editing the same device do
+                        copy = Device.objects.get(pk=device.pk)
+                        copy.repair_notes += f'{number}-{update}\n'
+                        copy.repairer_name = f'Repairer {number}'
+                        try:
+                            copy.save(update_fields=['repair_notes', 'repairer_name'])
+                            break
+                        except DeviceConflictError:
+                            pass  # Someone else saved first: read again and retry
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            list(pool.map(writer, range(self.threads)))
+
+        device.refresh_from_db()
+        expected = {f'{number}-{update}' for number in range(self.threads) for update in range(self.updates)}
+        self.assertEqual(set(device.repair_notes.split()), expected)
+        self.assertEqual(device.version, 1 + len(expected))
+
+
+@override_settings(DATABASE_ROUTERS=['devices.routers.ReplicaRouter'], DB_REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Replica views read from the replica, except in sessions that have just
+    written. The replica alias mirrors the primary in tests.
+    """
+
+    databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+
+    def setUp(self):
+        cache.clear()  # Dashboard tables cached by other tests would hide the reads
+        self.device = create_device()
+        self.wall_display = self.client_for('display')
+        self.reception = self.client_for('reception')
+
+    def client_for(self, username):
+        client = Client()
+        client.force_login(User.objects.create_user(username, password='test'))
+        return client
+
+    def databases_read(self, client, method, url, data=None):
+        """The aliases of the databases the request read devices from"""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica:
+            response = getattr(client, method)(url, data)
+        self.assertLess(response.status_code, 400)
+        return {
+            alias for alias, queries in [(DEFAULT_DB_ALIAS, primary), (REPLICA_DB_ALIAS, replica)]
+            if any(query['sql'].startswith('SELECT') and Device._meta.db_table in query['sql'] for query in queries)
+        }
+
+    def test_replica_views(self):
+        detail_url = reverse('device_detail', args=[self.device.device_id])
+        for url in [reverse('dashboard'), reverse('reminders'), detail_url]:
+            with self.subTest(url=url):
+                self.assertEqual(self.databases_read(self.wall_display, 'get', url), {REPLICA_DB_ALIAS})
+
+        scan_url = reverse('repair_station') + f'?device_id={self.device.device_id}'
+        self.assertEqual(self.databases_read(self.reception, 'get', scan_url), {DEFAULT_DB_ALIAS})
+
+    def test_reads_after_write_use_primary(self):
+        self.assertEqual(self.databases_read(self.reception, 'post', reverse('device_intake'), {
+            'customer_name': 'Replica Test',
+            'phone_number': '0612345678',
+            'device_type': 'Radio',
+            'brand_model': 'Philips AE5430',
+            'problem_description': 'Gaat niet meer aan.',
+        }), {DEFAULT_DB_ALIAS})
+        detail_url = reverse('device_detail', args=[Device.objects.latest('pk').device_id])
+
+        # The session that wrote, and only that session, reads from the primary for a while
+        self.assertEqual(self.databases_read(self.reception, 'get', detail_url), {DEFAULT_DB_ALIAS})
+        self.assertEqual(self.databases_read(self.reception, 'get', reverse('dashboard')), {DEFAULT_DB_ALIAS})
+        self.assertEqual(self.databases_read(self.wall_display, 'get', detail_url), {REPLICA_DB_ALIAS})
+
+        with mock.patch('devices.routers.time.time', return_value=time.time() + 11):
+            self.assertEqual(self.databases_read(self.reception, 'get', detail_url), {REPLICA_DB_ALIAS})
+
+    def test_dashboard_not_cached_from_lagging_replica(self):
+        # setUp has just saved a device, so the replica may not have it yet
+        response = self.wall_display.get(reverse('dashboard'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.databases_read(self.wall_display, 'get', reverse('dashboard')), {REPLICA_DB_ALIAS})
+
+        with mock.patch('devices.caching.time.time', return_value=time.time() + 11):
+            response = self.wall_display.get(reverse('dashboard'))
+            self.assertTrue(response.has_header('ETag'))
+            self.assertEqual(self.databases_read(self.wall_display, 'get', reverse('dashboard')), set())
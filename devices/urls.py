@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Async versions of the read-heavy views, for ASGI deployments (see async_views.py)
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     # Authentication
@@ -7,12 +11,20 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
 
     # Dashboard and Device Management
-    path('', views.dashboard, name='dashboard'),
+    path('', read_views.dashboard, name='dashboard'),
     path('intake/', views.device_intake, name='device_intake'),
-    path('device/<str:device_id>/', views.device_detail, name='device_detail'),
+    path('device/<str:device_id>/', read_views.device_detail, name='device_detail'),
     path('device/<str:device_id>/update/', views.device_update, name='device_update'),
     path('device/<str:device_id>/print/', views.print_label, name='print_label'),
     path('device/<str:device_id>/print-formulier/', views.print_formulier, name='print_formulier'),
-    path('repair-station/', views.repair_station, name='repair_station'),
-    path('reminders/', views.reminders, name='reminders'),
+    path('device/<str:device_id>/barcode.png', views.device_barcode, {'barcode_format': 'png'}, name='device_barcode_png'),
+    path('device/<str:device_id>/barcode.svg', views.device_barcode, {'barcode_format': 'svg'}, name='device_barcode_svg'),
+    path('print-batch/', views.print_batch, name='print_batch'),
+    path('repair-station/', read_views.repair_station, name='repair_station'),
+    path('repair-station/lookup/', views.device_lookup, name='device_lookup'),
+    path('repair-station/claim/', views.claim_next_device, name='claim_next_device'),
+    path('reminders/', read_views.reminders, name='reminders'),
+    path('stats/', views.device_stats, name='device_stats'),
+    path('export/devices.csv', views.device_export, {'export_format': 'csv'}, name='device_export_csv'),
+    path('export/devices.ndjson', views.device_export, {'export_format': 'ndjson'}, name='device_export_ndjson'),
 ]
@@ -1,12 +1,45 @@
+import hmac
+from datetime import datetime, time, timedelta
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Q
-from django.utils import timezone
-from .models import Device, User
-from .forms import DeviceIntakeForm, DeviceRepairForm, DeviceSearchForm, UserCreateForm, UserEditForm
-from .barcode_utils import generate_barcode_base64
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition, etag, require_POST
+from django.utils import dateformat, timezone
+from django.utils.http import urlencode
+from .models import ArchivedDevice, Device, DeviceConflictError, DeviceStatusEvent, User
+from .forms import (
+    BatchPrintForm, DeviceIntakeForm, DeviceRepairForm, DeviceSearchForm, UserCreateForm, UserEditForm,
+)
+from .barcode_utils import (
+    BARCODE_FORMATS, barcode_cache_key, generate_barcode, generate_barcodes_base64, get_barcode_format,
+)
+from .pagination import KeysetPaginator, MergedKeysetPaginator
+from .exports import EXPORT_FORMATS, export_lines
+from .filters import DeviceFilter
+from .stats import get_device_stats
+from .caching import dashboard_cache_key, dashboard_etag, replica_may_lag
+from .events import DEVICE_EVENTS_PATH
+from .lookup import LOOKUP_FIELDS, lookup_device
+from .intakers import intaker_options
+from .metrics import registry as metrics_registry
+
+
+def get_page_size(request):
+    """Read the requested page size, clamped to the configured maximum"""
+    try:
+        page_size = int(request.GET.get('page_size', settings.DASHBOARD_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.DASHBOARD_PAGE_SIZE
+    return max(1, min(page_size, settings.DASHBOARD_MAX_PAGE_SIZE))
 
 
 def admin_required(function):
@@ -46,67 +79,94 @@ def logout_view(request):
     return redirect('login')
 
 
-@login_required
-def dashboard(request):
-    """Main dashboard showing all devices"""
-    devices = Device.objects.select_related('intaker').all()
-
-    # Filter by status if provided
-    status_filter = request.GET.get('status', '')
-    if status_filter:
-        devices = devices.filter(status=status_filter)
-
-    # Filter by intaker if provided
-    intaker_filter = request.GET.get('intaker', '')
-    if intaker_filter:
-        devices = devices.filter(intaker_id=intaker_filter)
-
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        devices = devices.filter(
-            Q(device_id__icontains=search_query) |
-            Q(customer_name__icontains=search_query) |
-            Q(phone_number__icontains=search_query) |
-            Q(device_type__icontains=search_query) |
-            Q(brand_model__icontains=search_query)
-        )
+def dashboard_page_params(device_filter, page_size):
+    """Query parameters that next/previous links keep: the filters, search, sort and page size"""
+    page_params = device_filter.query_params()
+    if page_size != settings.DASHBOARD_PAGE_SIZE:
+        page_params['page_size'] = page_size
+    return page_params
 
-    # Sorting functionality
-    sort_by = request.GET.get('sort', '-intake_datetime')
-    allowed_sorts = [
-        'device_id', '-device_id',
-        'customer_name', '-customer_name',
-        'device_type', '-device_type',
-        'status', '-status',
-        'intake_datetime', '-intake_datetime',
-        'intaker__username', '-intaker__username',
-    ]
-    if sort_by in allowed_sorts:
-        devices = devices.order_by(sort_by)
-
-    # Get devices needing reminders
-    devices_needing_reminder = Device.objects.filter(
-        status__in=['open', 'in_progress']
-    ).exclude(
-        date_finished__isnull=False
-    )
-    reminder_count = sum(1 for d in devices_needing_reminder if d.needs_reminder())
 
-    # Get all intakers for filter dropdown
-    intakers = User.objects.filter(intaken_devices__isnull=False).distinct().order_by('username')
+def dashboard_cursor_params(request):
+    return {key: request.GET[key] for key in ('after', 'before') if request.GET.get(key)}
 
-    context = {
-        'devices': devices,
-        'status_filter': status_filter,
-        'intaker_filter': intaker_filter,
-        'search_query': search_query,
-        'sort_by': sort_by,
-        'reminder_count': reminder_count,
-        'status_choices': Device.STATUS_CHOICES,
+
+def dashboard_paginator(device_filter, page_size):
+    querysets = [queryset.select_related('intaker') for queryset in device_filter.querysets()]
+    if len(querysets) == 1:
+        return KeysetPaginator(querysets[0], device_filter.sort, page_size)
+    return MergedKeysetPaginator(querysets, device_filter.sort, page_size)
+
+
+def render_device_table(page, device_filter, page_params):
+    """HTML of one page of the dashboard table, with its pagination links"""
+    next_url = f"?{urlencode({**page_params, 'after': page.next_cursor})}" if page.has_next else None
+    previous_url = f"?{urlencode({**page_params, 'before': page.previous_cursor})}" if page.has_previous else None
+
+    return render_to_string('devices/includes/device_table.html', {
+        'devices': page,
+        'page': page,
+        'next_url': next_url,
+        'previous_url': previous_url,
+        'status_filter': device_filter.status,
+        'intaker_filter': device_filter.intaker,
+        'search_query': device_filter.search,
+        'include_archive': device_filter.include_archive,
+        'sort_by': device_filter.sort,
+    })
+
+
+def dashboard_context(device_filter, cached, intakers):
+    return {
+        'device_table': mark_safe(cached['device_table']),
+        'reminder_count': cached['reminder_count'],
         'intakers': intakers,
+        'filter_query': urlencode(device_filter.query_params()),
+        'status_filter': device_filter.status,
+        'intaker_filter': device_filter.intaker,
+        'search_query': device_filter.search,
+        'include_archive': device_filter.include_archive,
+        'sort_by': device_filter.sort,
+        'status_choices': Device.STATUS_CHOICES,
+        'live_updates': settings.LIVE_UPDATES,
+        'device_events_url': DEVICE_EVENTS_PATH,
+        'status_labels': {value: str(label) for value, label in Device.STATUS_CHOICES},
     }
-    return render(request, 'devices/dashboard.html', context)
+
+
+@login_required
+@condition(etag_func=dashboard_etag)
+def dashboard(request):
+    """Main dashboard showing all devices"""
+    device_filter = DeviceFilter.from_query(request.GET)
+    page_size = get_page_size(request)
+    page_params = dashboard_page_params(device_filter, page_size)
+
+    # The table and reminder count only change with the data, so they are
+    # cached until a device or user changes (see caching.py); the intaker
+    # list is cached separately (see intakers.py)
+    cache_key = dashboard_cache_key({**page_params, **dashboard_cursor_params(request)})
+    cached = cache.get(cache_key)
+
+    if cached is None:
+        # Keyset pagination: only one page of rows is fetched and rendered
+        page = dashboard_paginator(device_filter, page_size).page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+        cached = {
+            'device_table': render_device_table(page, device_filter, page_params),
+            # Count devices needing reminders in the database
+            'reminder_count': Device.objects.active().needing_reminder().count(),
+        }
+        if not replica_may_lag():
+            cache.set(cache_key, cached, settings.DASHBOARD_CACHE_TTL)
+
+    context = dashboard_context(device_filter, cached, intaker_options())
+    response = render(request, 'devices/dashboard.html', context)
+    # Browsers must revalidate every time; unchanged pages get a 304 (ETag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -126,28 +186,76 @@ def device_intake(request):
     return render(request, 'devices/intake.html', {'form': form})
 
 
+def status_history(events):
+    """
+    A device's status events, oldest first, each with `until`: when the
+    device left that status, or now for a status it is still in. Final
+    statuses have no end, so their `until` is None.
+    """
+    history = []
+    for event, next_event in zip(events, [*events[1:], None]):
+        if next_event is not None:
+            until = next_event.timestamp
+        elif event.status in Device.FINAL_STATUSES:
+            until = None
+        else:
+            until = timezone.now()
+        history.append({'event': event, 'until': until})
+    return history
+
+
+def status_events(device):
+    """Queryset of a device's status events in history order (archived devices too)"""
+    return DeviceStatusEvent.objects.filter(device_id=device.pk).order_by('timestamp', 'id')
+
+
 @login_required
 def device_detail(request, device_id):
     """View device details"""
-    device = get_object_or_404(Device, device_id=device_id)
-    return render(request, 'devices/detail.html', {'device': device})
+    device = Device.objects.filter(device_id=device_id).first()
+    if device is None:
+        device = get_object_or_404(ArchivedDevice, device_id=device_id)
+    context = {
+        'device': device,
+        'status_history': status_history(list(status_events(device))),
+    }
+    return render(request, 'devices/detail.html', context)
 
 
 @login_required
 def device_update(request, device_id):
     """Update device status and repair information"""
     device = get_object_or_404(Device, device_id=device_id)
+    conflict = False
 
     if request.method == 'POST':
         form = DeviceRepairForm(request.POST, instance=device)
         if form.is_valid():
-            form.save()
-            messages.success(request, f'Device {device.device_id} updated successfully!')
-            return redirect('device_detail', device_id=device.device_id)
+            try:
+                form.save()
+            except DeviceConflictError:
+                # Someone saved the device since this form was loaded: show
+                # the current device with this user's changes on top, so
+                # saving again keeps both
+                conflict = True
+                device = Device.objects.get(pk=device.pk)
+                current = DeviceRepairForm(instance=device)
+                data = request.POST.copy()
+                for name in current.fields:
+                    if current.fields[name].show_hidden_initial:
+                        data[current[name].html_initial_name] = current[name].value() or ''
+                        if name not in form.changed_data:
+                            data[name] = current[name].value() or ''
+                data['version'] = device.version
+                form = DeviceRepairForm(data, instance=device)
+                messages.error(request, f'Device {device.device_id} was changed by someone else while you were editing it. Your changes were not saved.')
+            else:
+                messages.success(request, f'Device {device.device_id} updated successfully!')
+                return redirect('device_detail', device_id=device.device_id)
     else:
         form = DeviceRepairForm(instance=device)
 
-    return render(request, 'devices/update.html', {'form': form, 'device': device})
+    return render(request, 'devices/update.html', {'form': form, 'device': device, 'conflict': conflict})
 
 
 @login_required
@@ -166,14 +274,77 @@ def repair_station(request):
     return render(request, 'devices/repair_station.html', {'form': form, 'device': device})
 
 
+@login_required
+def device_lookup(request):
+    """
+    A device's repair station details as JSON, for barcode scans. Served
+    from the lookup cache (lookup.py) without rendering a page.
+    """
+    device_id = request.GET.get('device_id', '').strip()
+    row = lookup_device(device_id) if device_id else None
+    if row is None:
+        return JsonResponse({'error': f'Device ID "{device_id}" not found.'}, status=404)
+    return repair_station_json(row)
+
+
+@login_required
+@require_POST
+def claim_next_device(request):
+    """
+    The repair station's work queue: move the oldest open device to in
+    progress for the logged-in repairer (or the posted repairer_name) and
+    show it. Answers requests that accept JSON like device_lookup does.
+    """
+    repairer_name = request.POST.get('repairer_name', '').strip() or str(request.user)
+    # Full names, and anything posted, can be longer than the column
+    repairer_name = repairer_name[:Device._meta.get_field('repairer_name').max_length]
+    device = Device.objects.claim_next(repairer_name)
+    wants_json = request.headers.get('Accept', '').startswith('application/json')
+
+    if device is None:
+        if wants_json:
+            return JsonResponse({'error': 'No open devices are waiting.'}, status=404)
+        messages.info(request, 'No open devices are waiting.')
+        return redirect('repair_station')
+
+    if wants_json:
+        return repair_station_json({field: getattr(device, field) for field in LOOKUP_FIELDS})
+    messages.success(request, f'Device {device.device_id} is now in progress for {repairer_name}.')
+    return redirect(reverse('repair_station') + '?' + urlencode({'device_id': device.device_id}))
+
+
+def repair_station_json(row):
+    """The JSON response for a device's LOOKUP_FIELDS, as the repair station shows them"""
+    device = Device(**row)
+    return JsonResponse({
+        **{field: value for field, value in row.items() if field not in ('intake_datetime', 'date_finished')},
+        'status_display': device.get_status_display(),
+        'intake_datetime': format_datetime(device.intake_datetime),
+        'date_finished': format_datetime(device.date_finished) if device.date_finished else '',
+        'days_in_repair': device.days_in_repair(),
+        'detail_url': reverse('device_detail', args=[device.device_id]),
+        'update_url': reverse('device_update', args=[device.device_id]),
+        'print_label_url': reverse('print_label', args=[device.device_id]),
+    })
+
+
+def format_datetime(value):
+    """A datetime as the repair station shows it (like the template filter date:"Y-m-d H:i")"""
+    return dateformat.format(timezone.localtime(value), 'Y-m-d H:i')
+
+
+def get_barcode_url(device_id):
+    """URL of the device's barcode image in the configured BARCODE_FORMAT"""
+    return reverse(f'device_barcode_{get_barcode_format()}', args=[device_id])
+
+
 @login_required
 def print_label(request, device_id):
     """Print label/ticket for device"""
     device = get_object_or_404(Device, device_id=device_id)
-    barcode_image = generate_barcode_base64(device.device_id)
     return render(request, 'devices/print_label.html', {
         'device': device,
-        'barcode_image': barcode_image,
+        'barcode_url': get_barcode_url(device.device_id),
     })
 
 
@@ -181,28 +352,155 @@ def print_label(request, device_id):
 def print_formulier(request, device_id):
     """Print A4 form for device"""
     device = get_object_or_404(Device, device_id=device_id)
-    barcode_image = generate_barcode_base64(device.device_id)
     return render(request, 'devices/print_formulier.html', {
         'device': device,
-        'barcode_image': barcode_image,
+        'barcode_url': get_barcode_url(device.device_id),
+    })
+
+
+def device_barcode_etag(request, device_id, barcode_format):
+    """ETag of a device's barcode, or None (no 304) if the device does not exist"""
+    if not Device.objects.filter(device_id=device_id).exists():
+        return None
+    return barcode_cache_key(device_id, barcode_format=barcode_format)
+
+
+@login_required
+@etag(device_barcode_etag)
+def device_barcode(request, device_id, barcode_format):
+    """Barcode image for a device; the ETag lets browsers revalidate without a render"""
+    if not Device.objects.filter(device_id=device_id).exists():
+        raise Http404('Device not found')
+
+    image_data = generate_barcode(device_id, barcode_format)
+    response = HttpResponse(image_data, content_type=BARCODE_FORMATS[barcode_format])
+    patch_cache_control(response, private=True, max_age=settings.BARCODE_MAX_AGE)
+    return response
+
+
+def start_of_day(day):
+    """Timezone-aware datetime at midnight of the given date"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+@login_required
+def print_batch(request):
+    """Print labels or A4 forms for many devices (e.g. a whole session) in one document"""
+    form = BatchPrintForm(request.GET or None)
+    devices = []
+    layout = 'label'
+
+    if form.is_valid():
+        layout = form.cleaned_data['layout'] or 'label'
+        device_ids = form.cleaned_data['device_ids']
+        intake_from = form.cleaned_data['intake_from']
+        intake_to = form.cleaned_data['intake_to']
+
+        # Fetch every selected device in a single query
+        queryset = Device.objects.select_related('intaker').order_by('intake_datetime', 'device_id')
+        if device_ids:
+            queryset = queryset.filter(device_id__in=device_ids)
+        if intake_from:
+            queryset = queryset.filter(intake_datetime__gte=start_of_day(intake_from))
+        if intake_to:
+            queryset = queryset.filter(intake_datetime__lt=start_of_day(intake_to + timedelta(days=1)))
+
+        limit = settings.BATCH_PRINT_LIMIT
+        devices = list(queryset[:limit + 1])
+        if len(devices) > limit:
+            devices = devices[:limit]
+            messages.warning(request, f'Only the first {limit} devices are included. Narrow the selection to print the rest.')
+
+        missing = set(device_ids) - {device.device_id for device in devices}
+        if missing and len(devices) < limit:
+            # Devices that exist were left out by the intake date range
+            outside_range = set(Device.objects.filter(device_id__in=missing).values_list('device_id', flat=True))
+            if missing - outside_range:
+                messages.error(request, f'Device ID(s) not found: {", ".join(sorted(missing - outside_range))}')
+            if outside_range:
+                messages.warning(
+                    request, f'Device ID(s) outside the intake date range: {", ".join(sorted(outside_range))}'
+                )
+
+        # Render all barcodes in parallel and inline them into the document
+        barcode_images = generate_barcodes_base64([device.device_id for device in devices])
+        for device, barcode_image in zip(devices, barcode_images):
+            device.barcode_image = barcode_image
+
+    return render(request, 'devices/print_batch.html', {
+        'form': form,
+        'devices': devices,
+        'layout': layout,
     })
 
 
+@login_required
+def device_stats(request):
+    """Aggregate device statistics as JSON (for the dashboard and wall displays)"""
+    response = JsonResponse(get_device_stats())
+    patch_cache_control(response, private=True, max_age=settings.DEVICE_STATS_CACHE_TTL)
+    return response
+
+
+# Reminders are listed the longest waiting first
+REMINDER_SORT = 'intake_datetime'
+
+
+def reminders_paginator(page_size):
+    return KeysetPaginator(Device.objects.active().needing_reminder(), REMINDER_SORT, page_size)
+
+
+def reminders_context(page, page_size, count):
+    page_params = {'page_size': page_size} if page_size != settings.DASHBOARD_PAGE_SIZE else {}
+    return {
+        'devices': page,
+        'page': page,
+        'count': count,
+        'next_url': f"?{urlencode({**page_params, 'after': page.next_cursor})}" if page.has_next else None,
+        'previous_url': f"?{urlencode({**page_params, 'before': page.previous_cursor})}" if page.has_previous else None,
+    }
+
+
 @login_required
 def reminders(request):
-    """View devices that need reminders"""
-    all_active_devices = Device.objects.filter(
-        status__in=['open', 'in_progress']
-    ).exclude(
-        date_finished__isnull=False
+    """View devices that need reminders, one page at a time"""
+    page_size = get_page_size(request)
+    page = reminders_paginator(page_size).page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
     )
+    count = Device.objects.active().needing_reminder().count()
+    return render(request, 'devices/reminders.html', reminders_context(page, page_size, count))
 
-    devices_needing_reminder = [d for d in all_active_devices if d.needs_reminder()]
 
-    context = {
-        'devices': devices_needing_reminder,
-    }
-    return render(request, 'devices/reminders.html', context)
+def metrics(request):
+    """Request metrics of this process in the Prometheus text format"""
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(settings.METRICS_TOKEN) and hmac.compare_digest(
+        authorization.encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()
+    )
+    if not token_ok and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@admin_required
+def device_export(request, export_format):
+    """Stream all devices matching the dashboard filters and sort as CSV or NDJSON (admin only)"""
+    device_filter = DeviceFilter.from_query(request.GET)
+    querysets = [queryset.order_by(*device_filter.ordering()) for queryset in device_filter.querysets()]
+
+    response = StreamingHttpResponse(
+        export_lines(querysets, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    filename = f"devices-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 # User Management Views (Admin Only)